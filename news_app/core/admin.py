@@ -4,3 +4,5 @@ from . import models
 
 admin.site.register(models.News)
 admin.site.register(models.Comment)
+admin.site.register(models.Vote)
+admin.site.register(models.DailyVotes)
@@ -0,0 +1,19 @@
+import asyncio
+import weakref
+
+import redis.asyncio
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """return the asyncio redis client of the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = redis.asyncio.from_url(
+            settings.REDIS_URL, **settings.REDIS_POOL_KWARGS
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,87 @@
+"""Async read path of the viewsets.
+
+Under an ASGI server a cached response or a 304 is answered on the event
+loop: the token is looked up in the auth cache and the response in the
+response cache, both through the asyncio redis client, so the request
+takes neither a thread nor a database connection. Cache misses and every
+other request run the regular sync view in a thread, which fills the
+caches for the next readers.
+
+Django 3.2 has no async ORM yet, so computing a response stays sync.
+"""
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException
+
+from core import cache
+
+
+class AsyncReadMixin:
+    """Serve the async_actions of a viewset from an async view"""
+
+    async_actions = ("list", "retrieve")
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if actions.get("get") not in cls.async_actions:
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method in ("GET", "HEAD"):
+                response = await cls.acached_read(
+                    request, actions, initkwargs, args, kwargs
+                )
+                if response is not None:
+                    return response
+            return await sync_view(request, *args, **kwargs)
+
+        # keeps csrf_exempt and what the router and schema read from views
+        return update_wrapper(async_view, view)
+
+    @classmethod
+    async def acached_read(cls, request, actions, initkwargs, args, kwargs):
+        """return the response to a read from the caches, or None"""
+        self = cls(**initkwargs)
+        self.action_map = actions
+        for method, action in actions.items():
+            setattr(self, method, getattr(self, action))
+        if hasattr(self, "get") and not hasattr(self, "head"):
+            self.head = self.get
+        self.args = args
+        self.kwargs = kwargs
+        self.request = self.initialize_request(request, *args, **kwargs)
+        self.action = actions["get"]
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        self.headers = self.default_response_headers
+        request = self.request
+
+        try:
+            negotiated = self.perform_content_negotiation(request)
+        except APIException:
+            return None
+        request.accepted_renderer, request.accepted_media_type = negotiated
+        if request.accepted_renderer.format != "json":
+            return None
+
+        for authenticator in request.authenticators:
+            if not hasattr(authenticator, "aauthenticate"):
+                continue
+            result = await authenticator.aauthenticate(request._request)
+            if result is not None:
+                request.user, request.auth = result
+                break
+        else:
+            return None
+        try:
+            self.check_permissions(request)
+        except APIException:
+            return None
+
+        response = await cache.acached_response(self, request)
+        if response is not None:
+            for name, value in self.headers.items():
+                response[name] = value
+        return response
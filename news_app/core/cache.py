@@ -0,0 +1,269 @@
+"""Cache of rendered API responses.
+
+Every cached response is stored under a key that contains the current
+generation of each scope its content depends on, such as the news list or
+one news. Writes bump the generations of the scopes they touch, so the old
+keys are simply never read again and expire on their own; nothing has to
+find and delete the stale entries.
+
+Generations are bumped right away and once more when the transaction
+commits. The second bump covers readers that saw the new generation but
+still read the rows from before the commit.
+
+When a key misses, only one request recomputes it. The others wait for
+that result for a little while instead of all hitting the database at once.
+
+The generations also make the validators of conditional requests: the
+ETag is derived from the cache key and Last-Modified is the time of the
+latest bump, so a client polling an unchanged resource gets a 304 without
+the view touching the database.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+
+from core.async_redis import get_async_redis
+
+GENERATION_KEY = "news:cache:gen:{scope}"
+MODIFIED_KEY = "news:cache:modified:{scope}"
+RESPONSE_KEY = "news:cache:{view}:{action}:{generations}:{request}"
+WAIT_INTERVAL = 0.05
+
+ALL_SCOPE = "all"
+LIST_SCOPE = "news"
+TRENDING_SCOPE = "trending"
+
+
+def news_scope(news_id):
+    """return the scope of one news"""
+    return f"news:{news_id}"
+
+
+def comments_scope(news_id):
+    """return the scope of the comments of one news"""
+    return f"comments:{news_id}"
+
+
+def versions(scopes):
+    """return the current generation of each scope and the time
+    the latest of them changed"""
+    keys = _version_keys(scopes)
+    redis = get_redis_connection()
+    values = redis.mget(keys)
+    if None in values:
+        pipe = redis.pipeline()
+        for scope in scopes:
+            _start_generation(pipe, scope)
+        pipe.mget(keys)
+        values = pipe.execute()[-1]
+    return _parse_versions(values, len(scopes))
+
+
+async def aversions(scopes):
+    """versions() on the asyncio redis client"""
+    keys = _version_keys(scopes)
+    redis = get_async_redis()
+    values = await redis.mget(keys)
+    if None in values:
+        async with redis.pipeline() as pipe:
+            for scope in scopes:
+                _start_generation(pipe, scope)
+            pipe.mget(keys)
+            values = (await pipe.execute())[-1]
+    return _parse_versions(values, len(scopes))
+
+
+def _version_keys(scopes):
+    return [GENERATION_KEY.format(scope=scope) for scope in scopes] + [
+        MODIFIED_KEY.format(scope=scope) for scope in scopes
+    ]
+
+
+def _parse_versions(values, count):
+    generations = [int(value) for value in values[:count]]
+    modified = max(float(value) for value in values[count:])
+    return generations, modified
+
+
+def invalidate(*scopes):
+    """make every cached response of the scopes stale"""
+    _bump(scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    pipe = get_redis_connection().pipeline()
+    now = time.time()
+    for scope in scopes:
+        _start_generation(pipe, scope)
+        pipe.incr(GENERATION_KEY.format(scope=scope))
+        pipe.set(MODIFIED_KEY.format(scope=scope), now)
+    pipe.execute()
+
+
+def _start_generation(pipe, scope):
+    # Start from the clock rather than 0, so a counter that was evicted
+    # never comes back to a generation that still has cached responses.
+    pipe.set(GENERATION_KEY.format(scope=scope), time.time_ns(), nx=True)
+    pipe.set(MODIFIED_KEY.format(scope=scope), time.time(), nx=True)
+
+
+def response_key(view, request):
+    """return the cache key of the response of view to request
+    and the time its content last changed"""
+    scopes = [ALL_SCOPE, *view.get_cache_scopes()]
+    generations, modified = versions(scopes)
+    return _format_key(view, request, generations), modified
+
+
+async def aresponse_key(view, request):
+    """response_key() on the asyncio redis client"""
+    scopes = [ALL_SCOPE, *view.get_cache_scopes()]
+    generations, modified = await aversions(scopes)
+    return _format_key(view, request, generations), modified
+
+
+def _format_key(view, request, generations):
+    digest = hashlib.sha1(
+        f"{request.build_absolute_uri()} {request.accepted_media_type}"
+        .encode()
+    ).hexdigest()
+    return RESPONSE_KEY.format(
+        view=view.basename,
+        action=view.action,
+        generations=".".join(str(gen) for gen in generations),
+        request=digest,
+    )
+
+
+def cache_response(view_method):
+    """cache the rendered json of a viewset action and answer
+    conditional requests for it
+
+    The key depends on the scopes returned by view.get_cache_scopes().
+    Only successful json responses are cached.
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != "json":
+            return view_method(view, request, *args, **kwargs)
+
+        key, modified = response_key(view, request)
+        etag, modified = _validators(key, modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified
+        )
+        if response is None:
+            response = _render(view_method, view, request, key, args, kwargs)
+        _set_validators(response, etag, modified)
+        return response
+
+    return wrapper
+
+
+async def acached_response(view, request):
+    """return the 304 or the cached response to request, or None when
+    the view has to compute it, without touching the database"""
+    key, modified = await aresponse_key(view, request)
+    etag, modified = _validators(key, modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+    if response is None:
+        if not settings.RESPONSE_CACHE_TTL:
+            return None
+        body = await get_async_redis().get(key)
+        if body is None:
+            return None
+        response = _cached_response(body, request.accepted_renderer)
+    _set_validators(response, etag, modified)
+    return response
+
+
+def _validators(key, modified):
+    """return the ETag and Last-Modified of the response under key"""
+    etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+    # Last-Modified has a resolution of one second, so it is only sent
+    # once that second is over and no later change can share it.
+    if modified > time.time() - 1:
+        return etag, None
+    return etag, int(modified)
+
+
+def _set_validators(response, etag, modified):
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if modified is not None:
+            response["Last-Modified"] = http_date(modified)
+
+
+def _render(view_method, view, request, key, args, kwargs):
+    """return the cached response under key, computing it on a miss"""
+    renderer = request.accepted_renderer
+    if not settings.RESPONSE_CACHE_TTL:
+        return view_method(view, request, *args, **kwargs)
+
+    redis = get_redis_connection()
+    body = redis.get(key)
+    if body is not None:
+        return _cached_response(body, renderer)
+
+    lock = redis.lock(
+        f"{key}:lock", timeout=settings.RESPONSE_CACHE_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        body = _wait_for(redis, key)
+        if body is not None:
+            return _cached_response(body, renderer)
+        # the recompute is too slow or died, do not wait any longer
+        lock = None
+
+    try:
+        response = view_method(view, request, *args, **kwargs)
+        if response.status_code == 200:
+            body = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                view.get_renderer_context(),
+            )
+            redis.set(key, body, ex=settings.RESPONSE_CACHE_TTL)
+            response.content = body
+            response["Content-Type"] = _content_type(renderer)
+        return response
+    finally:
+        if lock is not None:
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+
+def _wait_for(redis, key):
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        body = redis.get(key)
+        if body is not None:
+            return body
+    return None
+
+
+def _cached_response(body, renderer):
+    return HttpResponse(body, content_type=_content_type(renderer))
+
+
+def _content_type(renderer):
+    if renderer.charset is None:
+        return renderer.media_type
+    return f"{renderer.media_type}; charset={renderer.charset}"
@@ -0,0 +1,181 @@
+"""Change feed of news and comments.
+
+Every create, update and delete of a News or a Comment appends a Change
+row in the transaction of the write, deletes included as tombstones. Its
+id is the sequence number clients sync on: they keep the last one they
+applied and ask for the changes after it, which is a range scan of the
+primary key however large the tables are.
+
+Ids are handed out when a row is inserted, not when its transaction
+commits, so a change can become visible after one with a higher id. The
+feed only returns changes older than CHANGES_SETTLE_SECONDS and stops at
+the first younger one. That holds only while every write commits within
+the window and the clocks of the app servers agree with it: created_at
+is set by the process that writes the change, and a change committed
+later than that, or stamped by a clock running behind, can be passed
+over by a client that already read past its id.
+
+Counters moved by update(), comment_count on every comment created or
+deleted and up_votes when buffered upvotes are flushed, record an update
+of their news with record_updates. A change carries the counters as they
+are when it is read, upvotes still buffered included. When the voting
+day changes every count restarts at 0 without a change of its own.
+
+Changes older than CHANGES_RETENTION_DAYS are pruned, a client that has
+fallen further behind has to download everything again. A client
+starting without a sequence number gets the oldest change kept onwards.
+"""
+from datetime import timedelta
+from itertools import takewhile
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.fields import DateTimeField
+
+from core.models import Change, Comment, News
+from core.rows import CommentRows, NewsRows
+from core.serializers import NewsSlimSerializer
+
+# highest id pruned so far
+PRUNED_KEY = "changes:pruned"
+TYPES = {News: Change.NEWS, Comment: Change.COMMENT}
+
+
+class ChangesPruned(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "These changes are no longer kept, sync from scratch."
+    default_code = "changes_pruned"
+
+
+class ChangeFeedParams(serializers.Serializer):
+    """Query parameters of the change feed"""
+
+    since = serializers.IntegerField(required=False, min_value=0)
+    since_time = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.CHANGES_MAX_PAGE_SIZE,
+        default=settings.CHANGES_PAGE_SIZE,
+    )
+
+    def validate(self, attrs):
+        if "since" in attrs and "since_time" in attrs:
+            raise ValidationError({"since_time": [
+                "Ask for changes since a sequence number or a time, not both."
+            ]})
+        return attrs
+
+
+def record(instances, action):
+    """log action on instances, all of one model"""
+    Change.objects.bulk_create(
+        Change(type=TYPES[type(instance)], object_id=instance.pk,
+               action=action)
+        for instance in instances
+    )
+
+
+def record_updates(model, ids):
+    """log an update of the rows of model with ids, written by update()"""
+    Change.objects.bulk_create(
+        Change(type=TYPES[model], object_id=pk, action=Change.UPDATED)
+        for pk in ids
+    )
+
+
+def pruned_id():
+    return int(get_redis_connection().get(PRUNED_KEY) or 0)
+
+
+def since_time(moment):
+    """return the id to ask for the changes made after moment from"""
+    horizon = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    if moment < horizon and pruned_id():
+        raise ChangesPruned()
+    first = (
+        Change.objects.filter(created_at__gt=moment)
+        .order_by("created_at", "id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if first is None:
+        return Change.objects.order_by("-id").values_list(
+            "id", flat=True
+        ).first() or 0
+    return first - 1
+
+
+def changes_after(since, limit):
+    """return the settled changes after id since, at most limit of them,
+    with the current data of what they changed, and whether more changes
+    follow them, settled or not. Without since the feed starts at the
+    oldest change kept"""
+    if since is None:
+        since = pruned_id()
+    elif since < pruned_id():
+        raise ChangesPruned()
+    settled = timezone.now() - timedelta(
+        seconds=settings.CHANGES_SETTLE_SECONDS
+    )
+    fetched = list(Change.objects.filter(id__gt=since).order_by("id")[:limit])
+    changes = list(takewhile(
+        lambda change: change.created_at <= settled, fetched
+    ))
+    data = _current_data(changes)
+    created_at = DateTimeField()
+    return [
+        {
+            "seq": change.id,
+            "type": change.type,
+            "id": change.object_id,
+            "action": change.action,
+            "at": created_at.to_representation(change.created_at),
+            "data": data[change.type].get(change.object_id),
+        }
+        for change in changes
+    ], since, len(changes) < len(fetched) or len(fetched) == limit
+
+
+def _current_data(changes):
+    """return the news and comments of changes as they are now by type
+    and id, deleted ones are missing"""
+    ids = {Change.NEWS: set(), Change.COMMENT: set()}
+    for change in changes:
+        if change.action != Change.DELETED:
+            ids[change.type].add(change.object_id)
+
+    data = {Change.NEWS: {}, Change.COMMENT: {}}
+    if ids[Change.NEWS]:
+        rows = NewsRows(NewsSlimSerializer)
+        news = rows.serialize(rows.values(
+            News.objects.filter(pk__in=ids[Change.NEWS])
+        ))
+        data[Change.NEWS] = {item["id"]: item for item in news}
+    if ids[Change.COMMENT]:
+        rows = CommentRows()
+        comments = rows.serialize(rows.values(
+            Comment.objects.filter(pk__in=ids[Change.COMMENT])
+        ))
+        data[Change.COMMENT] = {item["id"]: item for item in comments}
+    return data
+
+
+def prune_changes(batch_size):
+    """delete the changes older than CHANGES_RETENTION_DAYS, return how
+    many"""
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    redis = get_redis_connection()
+    pruned = 0
+    while True:
+        ids = list(
+            Change.objects.filter(created_at__lt=cutoff)
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return pruned
+        # recorded first, a client must not read past a gap being made
+        redis.set(PRUNED_KEY, max(max(ids), pruned_id()))
+        pruned += Change.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,299 @@
+"""Server-Sent Events stream of new news, comments and upvote counts.
+
+``send_event`` appends an event to a capped Redis stream and publishes it
+on a pub/sub channel in one script, so event ids grow in the order the
+events are delivered. The stream keeps the recent history a client
+replays from when it reconnects with ``Last-Event-ID``.
+
+``event_stream`` is a plain ASGI application, mounted in news_app.asgi,
+because Django 3.2 cannot stream a response asynchronously. Each process
+holds a single pub/sub subscription and fans its messages out to the
+queues of its open streams, so an idle client costs a queue and no
+thread or redis connection. A client too slow to drain its queue is
+disconnected and catches up from the stream when it reconnects.
+"""
+import asyncio
+import json
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django_redis import get_redis_connection
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.async_redis import get_async_redis
+from user.authentication import CachedTokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+EVENTS_STREAM_KEY = "news:events"
+EVENTS_CHANNEL = "news:events:live"
+
+# XADD and PUBLISH together, so subscribers see the events in id order
+SEND_EVENT_SCRIPT = """
+local id = redis.call(
+    'XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*',
+    'event', ARGV[2], 'news', ARGV[3], 'data', ARGV[4]
+)
+redis.call('PUBLISH', KEYS[2], cjson.encode(
+    {id = id, event = ARGV[2], news = ARGV[3], data = ARGV[4]}
+))
+return id
+"""
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def send_event(event, news_id, data):
+    """publish an event about news_id once the transaction commits"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+
+    def send():
+        get_redis_connection().eval(
+            SEND_EVENT_SCRIPT, 2, EVENTS_STREAM_KEY, EVENTS_CHANNEL,
+            settings.EVENT_STREAM_LENGTH, event, news_id, payload,
+        )
+
+    transaction.on_commit(send)
+
+
+class Broadcaster:
+    """One pub/sub subscription of a process shared by its streams"""
+
+    def __init__(self):
+        self.queues = set()
+        self.listener = None
+        self.subscribed = None
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """yield a queue receiving every event published from now on"""
+        queue = asyncio.Queue(maxsize=settings.EVENT_QUEUE_SIZE)
+        self.queues.add(queue)
+        if self.listener is None:
+            self.subscribed = asyncio.Event()
+            self.listener = asyncio.ensure_future(
+                self.listen(self.subscribed)
+            )
+        try:
+            await self.subscribed.wait()
+            yield queue
+        finally:
+            self.queues.discard(queue)
+            if not self.queues and self.listener is not None:
+                self.listener.cancel()
+                self.listener = None
+
+    def is_subscribed(self, queue):
+        """whether queue still receives events, it is dropped when full"""
+        return queue in self.queues
+
+    async def listen(self, subscribed):
+        pubsub = get_async_redis().pubsub()
+        try:
+            await pubsub.subscribe(EVENTS_CHANNEL)
+            subscribed.set()
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is None:
+                    continue
+                event = json.loads(message["data"])
+                for queue in list(self.queues):
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        self.queues.discard(queue)
+        except Exception:
+            # end the open streams, their clients reconnect and resubscribe
+            logger.exception("Event subscription failed")
+            self.queues.clear()
+            self.listener = None
+            subscribed.set()
+        finally:
+            await pubsub.reset()
+
+
+def get_broadcaster():
+    """return the broadcaster of the running event loop"""
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = _broadcasters[loop] = Broadcaster()
+    return broadcaster
+
+
+async def event_stream(scope, receive, send):
+    """ASGI application streaming events as text/event-stream
+
+    Authenticates with the Authorization header or, since EventSource
+    cannot set headers, a ``token`` query parameter. ``news`` limits the
+    stream to the comments and upvotes of one news.
+    """
+    headers = {
+        name.decode("latin1"): value.decode("latin1")
+        for name, value in scope["headers"]
+    }
+    query = parse_qs(scope.get("query_string", b"").decode())
+
+    if not await _authenticate(headers, query):
+        await _respond(send, 401, b'{"detail": "Invalid token."}')
+        return
+
+    last_id = _clean_id(headers.get("last-event-id") or query.get(
+        "last_event_id", [None]
+    )[0])
+    news_id = query.get("news", [None])[0]
+    replay = last_id is not None
+    if not replay:
+        # taken before subscribing, an event published in between is then
+        # after it and streamed
+        latest = await get_async_redis().xrevrange(EVENTS_STREAM_KEY, count=1)
+        last_id = latest[0][0].decode() if latest else "0-0"
+
+    broadcaster = get_broadcaster()
+    async with broadcaster.subscribe() as queue:
+        if not broadcaster.is_subscribed(queue):
+            await _respond(
+                send, 503, b'{"detail": "Events are unavailable."}'
+            )
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": f"retry: {settings.EVENT_RETRY_MS}\n\n".encode(),
+            "more_body": True,
+        })
+        writer = asyncio.ensure_future(
+            _write_events(send, queue, last_id, news_id, replay)
+        )
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        done, pending = await asyncio.wait(
+            (writer, disconnect), return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        if writer in done:
+            writer.result()
+            await send({"type": "http.response.body", "body": b""})
+
+
+async def _write_events(send, queue, last_id, news_id, replay):
+    broadcaster = get_broadcaster()
+    if replay:
+        for stream_id, fields in await get_async_redis().xrange(
+            EVENTS_STREAM_KEY, min=last_id
+        ):
+            event = {
+                name.decode(): value.decode() for name, value in fields.items()
+            }
+            event["id"] = stream_id.decode()
+            if _after(event["id"], last_id):
+                await _send_event(send, event, news_id)
+                last_id = event["id"]
+
+    while True:
+        try:
+            event = await asyncio.wait_for(
+                queue.get(), timeout=settings.EVENT_KEEPALIVE
+            )
+        except asyncio.TimeoutError:
+            if not broadcaster.is_subscribed(queue):
+                return
+            await send({
+                "type": "http.response.body",
+                "body": b": keepalive\n\n",
+                "more_body": True,
+            })
+            continue
+        # replayed events also arrive through the subscription
+        if _after(event["id"], last_id):
+            await _send_event(send, event, news_id)
+            last_id = event["id"]
+        if queue.empty() and not broadcaster.is_subscribed(queue):
+            return
+
+
+async def _send_event(send, event, news_id):
+    if news_id is not None and event["news"] != news_id:
+        return
+    body = f"id: {event['id']}\nevent: {event['event']}\n"
+    body += f"data: {event['data']}\n\n"
+    await send({
+        "type": "http.response.body",
+        "body": body.encode(),
+        "more_body": True,
+    })
+
+
+def _after(stream_id, last_id):
+    """whether stream_id comes after last_id in the stream"""
+    try:
+        return _parse_id(stream_id) > _parse_id(last_id)
+    except ValueError:
+        return True
+
+
+def _clean_id(stream_id):
+    """stream_id if it is a stream id, None to stream live events only"""
+    if stream_id is None:
+        return None
+    try:
+        milliseconds, sequence = _parse_id(stream_id)
+    except ValueError:
+        return None
+    if milliseconds < 0 or sequence < 0:
+        return None
+    return f"{milliseconds}-{sequence}"
+
+
+def _parse_id(stream_id):
+    milliseconds, _, sequence = stream_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+async def _authenticate(headers, query):
+    authorization = headers.get("authorization", "").split()
+    if len(authorization) == 2 and authorization[0].lower() == "token":
+        key = authorization[1]
+    else:
+        key = query.get("token", [None])[0]
+    if not key:
+        return False
+
+    authentication = CachedTokenAuthentication()
+    if await authentication.acached_credentials(key):
+        return True
+    try:
+        await sync_to_async(authentication.authenticate_credentials)(key)
+    except AuthenticationFailed:
+        return False
+    return True
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _respond(send, status, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,112 @@
+"""Streaming export of the news and comment tables.
+
+An export reads its rows through a server-side cursor, chunk_size rows
+at a time, and hands them out as NDJSON or CSV lines as they arrive, so
+neither the client nor the server holds more than a chunk whatever the
+size of the table. The cursor is read inside a transaction: outside one,
+Django declares it WITH HOLD and Postgres materializes the whole result
+before the first row comes back.
+
+Rows come oldest first by created_at, and the created_at of the last one
+is the watermark to pass as since to export only what was created after.
+A row committed after an export but created before its watermark, by a
+transaction that ran long, is not picked up by the next one.
+"""
+import csv
+import itertools
+from datetime import datetime
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from core.models import Comment, News
+
+# the columns of each export, ids of relations are exported as they are
+EXPORTS = {
+    "news": (News, (
+        "id", "author_id", "title", "link", "created_at", "up_votes",
+        "votes_epoch", "comment_count",
+    )),
+    "comments": (Comment, (
+        "id", "news_id", "parent_id", "author_id", "content", "created_at",
+    )),
+}
+OUTPUTS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class ExportParams(serializers.Serializer):
+    """Query parameters of an export"""
+
+    output = serializers.ChoiceField(choices=tuple(OUTPUTS), default="ndjson")
+    since = serializers.DateTimeField(required=False)
+
+
+class _Line:
+    """file csv.writer writes one line to and gets it back from"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    """datetimes as orjson writes them in NDJSON"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            return value[:-6] + "Z"
+    return value
+
+
+class Export:
+    """Rows of kind created after since, as lines of output.
+
+    count and watermark follow the rows handed out so far.
+    """
+
+    def __init__(self, kind, output="ndjson", since=None, chunk_size=None):
+        self.model, self.columns = EXPORTS[kind]
+        self.output = output
+        self.since = since
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        self.count = 0
+        self.watermark = since
+        self.csv = csv.writer(_Line())
+
+    @property
+    def content_type(self):
+        return OUTPUTS[self.output]
+
+    def queryset(self):
+        queryset = self.model.objects.order_by("created_at", "id")
+        if self.since is not None:
+            queryset = queryset.filter(created_at__gt=self.since)
+        return queryset.values_list(*self.columns)
+
+    def __iter__(self):
+        """yield bytes of whole lines, a chunk of rows at a time"""
+        encode = self.csv_line if self.output == "csv" else self.ndjson_line
+        created_at = self.columns.index("created_at")
+        if self.output == "csv":
+            yield self.csv_line(self.columns)
+        with transaction.atomic():
+            rows = self.queryset().iterator(chunk_size=self.chunk_size)
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.count += len(chunk)
+                self.watermark = chunk[-1][created_at]
+                yield b"".join(encode(row) for row in chunk)
+
+    def ndjson_line(self, row):
+        return orjson.dumps(
+            dict(zip(self.columns, row)), option=orjson.OPT_UTC_Z
+        ) + b"\n"
+
+    def csv_line(self, row):
+        return self.csv.writerow([_csv_cell(value) for value in row]).encode()
@@ -0,0 +1,44 @@
+"""Normalized links, so the same story posted twice is recognized.
+
+Two links are the same story when they differ only in the case of the
+host, a default port, a fragment, tracking parameters or the order of the
+query. News store the sha256 of the normalized link in a unique column,
+so a duplicate is found by one index probe.
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "ref", "ref_src",
+})
+TRACKING_PREFIXES = ("utm_",)
+
+
+def normalize_link(link):
+    """return link with the parts that do not name the story normalized"""
+    parts = urlsplit(link.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking(name)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def link_hash(link):
+    """return the hex sha256 of the normalized link"""
+    return hashlib.sha256(normalize_link(link).encode()).hexdigest()
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
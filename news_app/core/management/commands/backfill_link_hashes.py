@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from core.links import link_hash
+from core.models import News
+
+
+class Command(BaseCommand):
+    """django command to fill News.link_hash of rows posted before it"""
+
+    help = (
+        "Hash the normalized link of news without one. A news repeating "
+        "the link of an older one is left without a hash and reported"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="News rows read and updated per batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        hashed = 0
+        duplicates = []
+        while True:
+            batch = list(
+                News.objects.filter(pk__gt=last_id, link_hash__isnull=True)
+                .order_by("pk")
+                .only("pk", "link")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+
+            for news in batch:
+                news.link_hash = link_hash(news.link)
+            taken = set(
+                News.objects.filter(
+                    link_hash__in=[news.link_hash for news in batch]
+                ).values_list("link_hash", flat=True)
+            )
+            # rows come oldest first, so the first of a link keeps it
+            unique = []
+            for news in batch:
+                if news.link_hash in taken:
+                    duplicates.append(news.pk)
+                else:
+                    taken.add(news.link_hash)
+                    unique.append(news)
+            News.objects.bulk_update(unique, ["link_hash"])
+            hashed += len(unique)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Hashed the links of {hashed} news")
+        )
+        if duplicates:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(duplicates)} news repeat an older link: "
+                    + ", ".join(map(str, duplicates))
+                )
+            )
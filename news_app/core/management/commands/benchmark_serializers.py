@@ -0,0 +1,119 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Comment, News
+from core.renderers import ORJSONRenderer
+from core.rows import CommentRows, NewsRows
+from core.serializers import (
+    CommentSerializer,
+    NewsSerializer,
+    NewsSlimSerializer,
+)
+
+
+class Command(BaseCommand):
+    """django command to compare the model and the row read paths"""
+
+    help = (
+        "Fetch, serialize and render pages of news and comments with "
+        "ModelSerializer and JSONRenderer, then with values() rows and "
+        "ORJSONRenderer, and report rows per second of both"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=100,
+            help="Rows per page",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=2,
+            help="Seconds each path of each workload runs",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        # sample rows are created when the tables are short and always
+        # rolled back
+        with transaction.atomic():
+            news = self.sample(rows)
+            comments = Comment.objects.filter(news=news).select_related(
+                "author"
+            ).order_by("-created_at", "-id")
+            latest = News.objects.select_related("author").order_by(
+                "-created_at", "-id"
+            )[:rows]
+            with_comments = latest.prefetch_related(Prefetch(
+                "comment_news",
+                queryset=Comment.objects.select_related("author"),
+            ))
+            workloads = [
+                ("news", lambda: NewsSerializer(with_comments, many=True),
+                 NewsRows(), with_comments),
+                ("news slim", lambda: NewsSlimSerializer(latest, many=True),
+                 NewsRows(NewsSlimSerializer), latest),
+                ("comments",
+                 lambda: CommentSerializer(comments[:rows], many=True),
+                 CommentRows(), comments[:rows]),
+            ]
+
+            self.stdout.write(
+                f"{'workload':<12}{'model rows/s':>14}{'rows rows/s':>14}"
+                f"{'speedup':>9}{'identical':>11}"
+            )
+            for name, serializer, row_serializer, queryset in workloads:
+                model_rate, model_body = self.measure(
+                    options["duration"],
+                    lambda: JSONRenderer().render(serializer().data),
+                )
+                rows_rate, rows_body = self.measure(
+                    options["duration"],
+                    lambda: ORJSONRenderer().render(row_serializer.serialize(
+                        row_serializer.values(queryset.all())
+                    )),
+                )
+                self.stdout.write(
+                    f"{name:<12}{model_rate * rows:>14.0f}"
+                    f"{rows_rate * rows:>14.0f}"
+                    f"{rows_rate / model_rate:>8.1f}x"
+                    f"{'yes' if model_body == rows_body else 'NO':>11}"
+                )
+            transaction.set_rollback(True)
+
+    def sample(self, rows):
+        """make sure rows news and rows comments exist, return the news
+        the comments are on"""
+        user = get_user_model().objects.create_user(
+            email="benchmark@example.com", name="Benchmark"
+        )
+        missing = max(rows - News.objects.count(), 0)
+        News.objects.bulk_create(
+            News(author=user, title=f"Benchmark news {number}",
+                 link=f"https://example.com/benchmark/{number}")
+            for number in range(missing)
+        )
+        news = News.objects.create(
+            author=user, title="Benchmark thread",
+            link="https://example.com/benchmark/thread",
+        )
+        Comment.objects.bulk_create(
+            Comment(author=user, news=news, content=f"Comment {number}")
+            for number in range(rows)
+        )
+        return news
+
+    def measure(self, duration, render):
+        """run render for duration seconds, return the pages per second
+        and the last body"""
+        body = render()
+        runs = 0
+        started = time.perf_counter()
+        deadline = started + duration
+        while time.perf_counter() < deadline:
+            body = render()
+            runs += 1
+        return runs / (time.perf_counter() - started), body
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from core.export import EXPORTS, OUTPUTS, Export
+
+
+class Command(BaseCommand):
+    """django command to export every news or comment"""
+
+    help = (
+        "Write every news or every comment created after --since as NDJSON "
+        "or CSV, streamed from a server-side cursor"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=tuple(EXPORTS))
+        parser.add_argument(
+            "--output", choices=tuple(OUTPUTS), default="ndjson",
+            help="Format of the rows",
+        )
+        parser.add_argument(
+            "--since",
+            help="Export only rows created after this ISO 8601 time, the "
+                 "watermark a previous export reported",
+        )
+        parser.add_argument(
+            "--file", default="-",
+            help="File to write to, - for stdout",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=None,
+            help="Rows fetched from the cursor at a time",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None or since.tzinfo is None:
+                raise CommandError(
+                    "--since must be an ISO 8601 time with a UTC offset."
+                )
+
+        export = Export(
+            options["kind"], output=options["output"], since=since,
+            chunk_size=options["chunk_size"],
+        )
+        if options["file"] == "-":
+            for lines in export:
+                self.stdout.write(lines.decode(), ending="")
+        else:
+            with open(options["file"], "wb") as file:
+                for lines in export:
+                    file.write(lines)
+
+        # stdout may be the export itself
+        watermark = export.watermark.isoformat() if export.watermark else "-"
+        self.stderr.write(
+            f"Exported {export.count} rows, watermark {watermark}",
+            style_func=self.style.SUCCESS,
+        )
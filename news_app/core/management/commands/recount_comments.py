@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core import cache
+from core.models import Comment, News
+
+
+class Command(BaseCommand):
+    """django command to recompute News.comment_count from the comments"""
+
+    help = "Recompute the denormalized comment count of every news"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="News rows updated per statement",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        counts = (
+            Comment.objects.filter(news=OuterRef("pk"))
+            .order_by()
+            .values("news")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        real_count = Coalesce(Subquery(counts), 0)
+
+        last_id = 0
+        fixed = 0
+        while True:
+            ids = list(
+                News.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            fixed += (
+                News.objects.filter(pk__in=ids)
+                .exclude(comment_count=real_count)
+                .update(comment_count=real_count)
+            )
+            last_id = ids[-1]
+
+        if fixed:
+            # update() sends no signal, the cached responses and their ETags
+            # still hold the old counts
+            cache.invalidate(cache.ALL_SCOPE)
+        self.stdout.write(
+            self.style.SUCCESS(f"Fixed comment count of {fixed} news")
+        )
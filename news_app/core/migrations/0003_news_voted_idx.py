@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_vote'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(condition=models.Q(('up_votes', 0), _negated=True), fields=['id'], name='news_voted_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:26
+
+import datetime
+
+import pytz
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def count_existing_votes_today(apps, schema_editor):
+    """attach the votes cast before this migration to the current day"""
+    News = apps.get_model("core", "News")
+    Vote = apps.get_model("core", "Vote")
+    DailyVotes = apps.get_model("core", "DailyVotes")
+    today = timezone.localdate(
+        timezone=pytz.timezone(settings.CELERY_TIMEZONE)
+    )
+
+    Vote.objects.update(epoch=today)
+    voted = News.objects.exclude(up_votes=0)
+    DailyVotes.objects.bulk_create(
+        DailyVotes(news_id=news_id, epoch=today, up_votes=up_votes)
+        for news_id, up_votes in voted.values_list("id", "up_votes").iterator()
+    )
+    voted.update(votes_epoch=today)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_news_voted_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVotes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateField()),
+                ('up_votes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='vote',
+            name='unique_news_user_vote',
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='votes_epoch',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='epoch',
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='news',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='core.news'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('epoch', 'news', 'user'), name='unique_epoch_news_user_vote'),
+        ),
+        migrations.AddField(
+            model_name='dailyvotes',
+            name='news',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_votes', to='core.news'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvotes',
+            index=models.Index(fields=['epoch'], name='dailyvotes_epoch_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvotes',
+            constraint=models.UniqueConstraint(fields=('news', 'epoch'), name='unique_news_epoch_votes'),
+        ),
+        migrations.RunPython(
+            count_existing_votes_today, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_vote_epochs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE core_news SET comment_count = c.total
+            FROM (
+                SELECT news_id, COUNT(*) AS total
+                FROM core_comment GROUP BY news_id
+            ) AS c
+            WHERE core_news.id = c.news_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
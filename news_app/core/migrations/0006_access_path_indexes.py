@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:31
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_news_comment_count'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['news', '-created_at', '-id'], name='comment_news_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['author', '-created_at'], name='comment_author_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='news',
+            index=models.Index(fields=['-created_at', '-id'], name='news_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='news',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='news_author_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='news',
+            index=models.Index(fields=['-up_votes', '-id'], name='news_up_votes_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='link_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        # build the index without blocking writes, then let the constraint
+        # take it over
+        migrations.RunSQL(
+            sql=[
+                'CREATE UNIQUE INDEX CONCURRENTLY "news_link_hash_key" '
+                'ON "core_news" ("link_hash")',
+                'ALTER TABLE "core_news" ADD CONSTRAINT "news_link_hash_key" '
+                'UNIQUE USING INDEX "news_link_hash_key"',
+            ],
+            reverse_sql=[
+                'ALTER TABLE "core_news" DROP CONSTRAINT "news_link_hash_key"',
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='news',
+                    constraint=models.UniqueConstraint(fields=('link_hash',), name='news_link_hash_key'),
+                ),
+            ],
+        ),
+    ]
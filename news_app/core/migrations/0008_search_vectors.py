@@ -0,0 +1,71 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# tsvector_update_trigger keeps the column current on every insert and
+# update, bulk_create and QuerySet.update() included
+TRIGGER_SQL = """
+CREATE TRIGGER "{table}_search_vector_update"
+BEFORE INSERT OR UPDATE OF "{column}" ON "{table}"
+FOR EACH ROW EXECUTE FUNCTION
+tsvector_update_trigger("search_vector", 'pg_catalog.english', "{column}")
+"""
+
+DROP_TRIGGER_SQL = 'DROP TRIGGER "{table}_search_vector_update" ON "{table}"'
+
+# rows written before the trigger, in batches to keep locks short
+BACKFILL_SQL = """
+UPDATE "{table}" SET "search_vector" = to_tsvector('pg_catalog.english', "{column}")
+WHERE "id" IN (
+    SELECT "id" FROM "{table}" WHERE "search_vector" IS NULL LIMIT 10000
+)
+"""
+
+SEARCHED = (("core_news", "title"), ("core_comment", "content"))
+
+
+def backfill(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in SEARCHED:
+            while True:
+                cursor.execute(BACKFILL_SQL.format(table=table, column=column))
+                if not cursor.rowcount:
+                    break
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_news_link_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=[TRIGGER_SQL.format(table=table, column=column) for table, column in SEARCHED],
+            reverse_sql=[DROP_TRIGGER_SQL.format(table=table) for table, _ in SEARCHED],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='comment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='comment_search_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='news',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='news_search_idx'),
+        ),
+    ]
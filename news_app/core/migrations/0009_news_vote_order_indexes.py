@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:55
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_search_vectors'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='news',
+            index=models.Index(fields=['votes_epoch', '-up_votes', '-id'], name='news_epoch_up_votes_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='news',
+            index=models.Index(fields=['author', 'votes_epoch', '-up_votes', '-id'], name='news_author_epoch_votes_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_news_vote_order_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+# the path of a comment is the path of its parent and its own id, on every
+# insert, bulk_create included. Rows inserted before it by the same
+# statement are visible, so a parent and its replies can go in together
+TRIGGER_SQL = """
+CREATE FUNCTION "core_comment_path"() RETURNS trigger AS $$
+BEGIN
+    NEW."path" := COALESCE(
+        (SELECT "path" FROM "core_comment" WHERE "id" = NEW."parent_id"), ''
+    ) || lpad(to_hex(NEW."id"), 12, '0');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "core_comment_path_insert"
+BEFORE INSERT ON "core_comment"
+FOR EACH ROW EXECUTE FUNCTION "core_comment_path"();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER "core_comment_path_insert" ON "core_comment";
+DROP FUNCTION "core_comment_path"();
+"""
+
+# comments written before replies are all top level, in batches to keep
+# locks short
+BACKFILL_SQL = """
+UPDATE "core_comment" SET "path" = lpad(to_hex("id"), 12, '0')
+WHERE "id" IN (
+    SELECT "id" FROM "core_comment" WHERE "path" IS NULL LIMIT 10000
+)
+"""
+
+
+def backfill(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(BACKFILL_SQL)
+            if not cursor.rowcount:
+                break
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='core.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(db_collation='C', editable=False, max_length=384, null=True),
+        ),
+        migrations.RunSQL(sql=TRIGGER_SQL, reverse_sql=DROP_TRIGGER_SQL),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['news', 'path'], name='comment_thread_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['news', 'path'], name='comment_top_level_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'path'], name='comment_parent_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:40
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_comment_threads'),
+    ]
+
+    operations = [
+        # news are only ordered by the votes of the current voting day, by
+        # news_epoch_up_votes_idx and news_author_epoch_votes_idx
+        RemoveIndexConcurrently(
+            model_name='news',
+            name='news_up_votes_idx',
+        ),
+    ]
@@ -1,16 +1,67 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+# hex digits of each id in Comment.path and the most ids it holds
+PATH_WIDTH = 12
+MAX_DEPTH = 32
+
 
 class News(models.Model):
     title = models.CharField(max_length=255)
     link = models.URLField(blank=False, null=False)
+    # sha256 of the normalized link, see core.links
+    link_hash = models.CharField(
+        max_length=64, null=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     up_votes = models.IntegerField(default=0)
+    # voting day up_votes was counted in, older counts read as 0
+    votes_epoch = models.DateField(null=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # tsvector of the title, set by a database trigger, see core.search
+    search_vector = SearchVectorField(null=True, editable=False)
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, editable=False
     )
 
+    class Meta:
+        indexes = [
+            # lets compaction find rows with votes without a full scan
+            models.Index(
+                fields=("id",),
+                name="news_voted_idx",
+                condition=~models.Q(up_votes=0),
+            ),
+            # feed order, also the keyset pagination seek and, read
+            # backwards, the export order
+            models.Index(
+                fields=("-created_at", "-id"), name="news_created_idx"
+            ),
+            models.Index(
+                fields=("author", "-created_at", "-id"),
+                name="news_author_created_idx",
+            ),
+            # votes of the current voting day, see core.filters
+            models.Index(
+                fields=("votes_epoch", "-up_votes", "-id"),
+                name="news_epoch_up_votes_idx",
+            ),
+            models.Index(
+                fields=("author", "votes_epoch", "-up_votes", "-id"),
+                name="news_author_epoch_votes_idx",
+            ),
+            GinIndex(fields=("search_vector",), name="news_search_idx"),
+        ]
+        constraints = [
+            # rows posted before the column are left empty by the backfill
+            # when they repeat an older link
+            models.UniqueConstraint(
+                fields=("link_hash",), name="news_link_hash_key"
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -29,8 +80,135 @@ class Comment(models.Model):
         blank=False,
         null=False,
     )
+    # the comment replied to, None for a top level comment
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="replies",
+        db_index=False,
+    )
     content = models.CharField(max_length=144, blank=False, null=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # ids of the ancestors and of the comment, set by a database trigger,
+    # see core.threads
+    path = models.CharField(
+        max_length=PATH_WIDTH * MAX_DEPTH,
+        db_collation="C",
+        null=True,
+        editable=False,
+    )
+    # tsvector of the content, set by a database trigger, see core.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # thread order, also the keyset pagination seek
+            models.Index(
+                fields=("news", "-created_at", "-id"),
+                name="comment_news_created_idx",
+            ),
+            models.Index(
+                fields=("author", "-created_at"),
+                name="comment_author_created_idx",
+            ),
+            # thread order, subtrees are ranges of it
+            models.Index(fields=("news", "path"), name="comment_thread_idx"),
+            models.Index(
+                fields=("news", "path"),
+                name="comment_top_level_idx",
+                condition=models.Q(parent__isnull=True),
+            ),
+            # replies in thread order, also the parent foreign key
+            models.Index(fields=("parent", "path"), name="comment_parent_idx"),
+            # export order, see core.export
+            models.Index(
+                fields=("created_at", "id"), name="comment_created_idx"
+            ),
+            GinIndex(fields=("search_vector",), name="comment_search_idx"),
+        ]
 
     def __str__(self):
         return f"{self.author}'s comment: {self.content}"
+
+
+class Vote(models.Model):
+    """One upvote of a user on a news, at most one per voting day"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="votes",
+    )
+    news = models.ForeignKey(
+        News,
+        on_delete=models.CASCADE,
+        related_name="votes",
+    )
+    epoch = models.DateField()
+
+    class Meta:
+        constraints = [
+            # epoch first so old days can be deleted by range
+            models.UniqueConstraint(
+                fields=("epoch", "news", "user"), name="unique_epoch_news_user_vote"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user}'s vote: {self.news}"
+
+
+class DailyVotes(models.Model):
+    """Upvotes a news received during one voting day"""
+
+    news = models.ForeignKey(
+        News,
+        on_delete=models.CASCADE,
+        related_name="daily_votes",
+    )
+    epoch = models.DateField()
+    up_votes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=("news", "epoch"), name="unique_news_epoch_votes"
+            )
+        ]
+        indexes = [
+            models.Index(fields=("epoch",), name="dailyvotes_epoch_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.news} on {self.epoch}: {self.up_votes}"
+
+
+class Change(models.Model):
+    """One write to a news or a comment, see core.changes. The id is the
+    sequence number of the change feed"""
+
+    NEWS = "news"
+    COMMENT = "comment"
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+    type = models.CharField(
+        max_length=8, choices=((NEWS, "News"), (COMMENT, "Comment"))
+    )
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=8, choices=(
+        (CREATED, "Created"), (UPDATED, "Updated"), (DELETED, "Deleted"),
+    ))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # ?since_time= and pruning
+            models.Index(fields=("created_at", "id"), name="change_created_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.type} {self.object_id} {self.action}"
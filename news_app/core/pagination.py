@@ -0,0 +1,214 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict, namedtuple
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple("Cursor", ["reverse", "position"])
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset (seek) pagination over a unique, composite ordering.
+
+    Unlike DRF's CursorPagination, which only seeks on the first ordering
+    field and falls back to an offset for ties, the cursor holds the value
+    of every ordering field of the boundary row. Every page is then a
+    single indexed range scan, so deep pages cost the same as the first.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(_invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+
+        if current_position is not None:
+            position = self._parse_position(queryset, current_position)
+            queryset = queryset.filter(_seek(ordering, position))
+
+        # Fetch one extra row to find out whether a following page exists.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        """return the Cursor encoded in the request, if any"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(b64decode(encoded.encode("ascii"), validate=True))
+            reverse = bool(tokens.get("r", 0))
+            position = tokens["p"]
+            if not isinstance(position, list):
+                raise ValueError(position)
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        """return the current url with the cursor replaced"""
+        tokens = {"p": cursor.position}
+        if cursor.reverse:
+            tokens["r"] = 1
+
+        querystring = json.dumps(tokens, separators=(",", ":"))
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            position.append(value if isinstance(value, int) else str(value))
+        return position
+
+    def _parse_position(self, queryset, position):
+        """convert raw cursor values back to python values of the fields"""
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        opts = queryset.model._meta
+        values = []
+        for field, raw in zip(self.ordering, position):
+            name = field.lstrip("-")
+            try:
+                model_field = opts.pk if name == "pk" else opts.get_field(name)
+                values.append(model_field.to_python(raw))
+            except Exception:
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+
+class ThreadPagination(KeysetPagination):
+    """Keyset pages of comments in thread order, see core.threads"""
+
+    ordering = ("path",)
+
+
+class SearchPagination(LimitOffsetPagination):
+    """Limit/offset pages of search results, best match first.
+
+    The rank of a match is computed by the query, so there is no column to
+    seek on. Like the keyset pages, one extra row tells whether a next page
+    exists, which saves counting every match.
+    """
+
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = replace_query_param(
+            self.request.build_absolute_uri(), self.limit_query_param,
+            self.limit,
+        )
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+
+def _invert(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _seek(ordering, position):
+    """build the row-value comparison that skips past ``position``
+
+    For ``(-created_at, -id)`` this is
+    ``created_at <= c AND (created_at < c OR (created_at = c AND id < i))``;
+    the leading bound lets the planner use it as an index range condition.
+    """
+    names = [field.lstrip("-") for field in ordering]
+    lookups = ["lt" if field.startswith("-") else "gt" for field in ordering]
+
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        step = Q(**{f"{names[i]}__{lookups[i]}": position[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{names[i]: position[i]}) & condition
+        condition = step
+
+    bound = f"{names[0]}__{lookups[0]}e"
+    return Q(**{bound: position[0]}) & condition
@@ -0,0 +1,151 @@
+"""Fast read path of the news and comment lists.
+
+A ModelSerializer builds a model instance per row and then looks every
+field up through its serializer field. The lists read values() rows
+instead and turn each one into a dict with accessors chosen once per
+request. The output is the same as NewsSerializer and CommentSerializer
+give for the same rows, which the tests compare byte for byte.
+"""
+from operator import itemgetter
+
+from rest_framework import ISO_8601
+from rest_framework.fields import DateTimeField
+from rest_framework.settings import api_settings
+
+from core import votes
+from core.models import Comment
+from core.serializers import CommentSerializer, NewsSerializer
+
+# values() columns each serialized field reads
+NEWS_COLUMNS = {
+    "id": ("id",),
+    "title": ("title",),
+    "created_at": ("created_at",),
+    "author": ("author_id", "author__name"),
+    "link": ("link",),
+    "up_votes": ("up_votes", "votes_epoch"),
+    "comment_count": ("comment_count",),
+}
+# the keyset every ordering of the list pages on
+KEYSET_COLUMNS = ("id", "created_at", "up_votes")
+# path is the keyset of thread pages
+COMMENT_COLUMNS = (
+    "id", "author__name", "news_id", "parent_id", "content", "created_at",
+    "path",
+)
+
+
+def _datetime(column):
+    """accessor of a datetime column formatted as DateTimeField does"""
+    field = DateTimeField()
+    timezone = field.default_timezone()
+    if api_settings.DATETIME_FORMAT.lower() != ISO_8601 or timezone is None:
+        return lambda row: field.to_representation(row[column])
+
+    def get(row):
+        value = row[column]
+        if value is None:
+            return None
+        value = value.astimezone(timezone).isoformat()
+        if value.endswith("+00:00"):
+            return value[:-6] + "Z"
+        return value
+
+    return get
+
+
+class CommentRows:
+    """Serialize comment rows the way CommentSerializer does"""
+
+    def __init__(self):
+        accessors = {
+            "id": itemgetter("id"),
+            "author": itemgetter("author__name"),
+            "news": itemgetter("news_id"),
+            "parent": itemgetter("parent_id"),
+            "content": itemgetter("content"),
+            "created_at": _datetime("created_at"),
+        }
+        self.accessors = [
+            (name, accessors[name]) for name in CommentSerializer.Meta.fields
+        ]
+
+    def values(self, queryset):
+        """return queryset as the rows serialize reads"""
+        return queryset.values(*COMMENT_COLUMNS)
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+    def to_representation(self, row):
+        return {name: get(row) for name, get in self.accessors}
+
+
+class NewsRows:
+    """Serialize news rows the way serializer_class does with the same
+    fields and expand"""
+
+    def __init__(self, serializer_class=NewsSerializer, fields=None,
+                 expand=()):
+        self.fields = [
+            name for name in serializer_class.Meta.fields
+            if fields is None or name in fields
+        ]
+        self.comment_rows = CommentRows()
+        self.live_upvotes = {}
+        self.comments = {}
+
+        accessors = {
+            "id": itemgetter("id"),
+            "title": itemgetter("title"),
+            "created_at": _datetime("created_at"),
+            "author": itemgetter("author__name"),
+            "link": itemgetter("link"),
+            "up_votes": lambda row: self.live_upvotes[row["id"]],
+            "comment_count": itemgetter("comment_count"),
+            "comment_news": lambda row: self.comments.get(row["id"], []),
+        }
+        if "author" in expand:
+            accessors["author"] = lambda row: {
+                "id": row["author_id"], "name": row["author__name"],
+            }
+        self.expand_comments = "comment_news" in expand
+        self.accessors = [(name, accessors[name]) for name in self.fields]
+
+    def values(self, queryset):
+        """return queryset as the rows serialize reads"""
+        columns = set(KEYSET_COLUMNS)
+        for name in self.fields:
+            columns.update(NEWS_COLUMNS.get(name, ()))
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        if "up_votes" in self.fields:
+            self.live_upvotes = votes.live_upvotes_of_rows(rows)
+        if "comment_news" in self.fields:
+            self.comments = self.fetch_comments(rows)
+        return [
+            {name: get(row) for name, get in self.accessors} for row in rows
+        ]
+
+    def fetch_comments(self, rows):
+        """return the comments of the news of rows by news id, in the order
+        of the prefetch of the view"""
+        if not rows:
+            return {}
+        comments = {}
+        queryset = Comment.objects.filter(
+            news__in=[row["id"] for row in rows]
+        )
+        for comment in self.comment_rows.values(queryset):
+            if self.expand_comments:
+                value = self.comment_rows.to_representation(comment)
+            else:
+                # str() of a Comment
+                value = (
+                    f"{comment['author__name']}'s comment: "
+                    f"{comment['content']}"
+                )
+            comments.setdefault(comment["news_id"], []).append(value)
+        return comments
@@ -0,0 +1,49 @@
+"""Full-text search of news titles and comments.
+
+On Postgres, News.search_vector and Comment.search_vector hold the
+tsvector of the title and of the content. Triggers keep them current on
+every write, bulk_create and update() included, and GIN indexes answer
+the match. Other databases fall back to matching each word with LIKE,
+enough for tests but not for a large table.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q, Value
+
+from core.models import Comment
+
+# the text search config of the triggers in migration 0008
+SEARCH_CONFIG = "english"
+
+
+def search_news(queryset, terms, comments=False):
+    """return the news of queryset matching the web search syntax of
+    terms, best match first. comments also matches news by the contents
+    of their comments"""
+    if connection.vendor != "postgresql":
+        return _like_search(queryset, terms, comments)
+
+    query = SearchQuery(terms, config=SEARCH_CONFIG, search_type="websearch")
+    matches = Q(search_vector=query)
+    if comments:
+        # a UNION lets each side use its index, an OR would scan the news
+        ids = queryset.model.objects.filter(matches).values("pk").union(
+            Comment.objects.filter(search_vector=query).values("news_id")
+        )
+        matches = Q(pk__in=ids)
+    return (
+        queryset.filter(matches)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-id")
+    )
+
+
+def _like_search(queryset, terms, comments):
+    for word in terms.split():
+        matches = Q(title__icontains=word)
+        if comments:
+            matches |= Q(pk__in=Comment.objects.filter(
+                content__icontains=word
+            ).values("news_id"))
+        queryset = queryset.filter(matches)
+    return queryset.annotate(rank=Value(0.0)).order_by("-id")
@@ -1,16 +1,90 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
 from rest_framework import serializers
 
-from core.models import News, Comment
+from core import links, threads, votes
+from core.models import MAX_DEPTH, News, Comment, DailyVotes
+
+
+class NewsListSerializer(serializers.ListSerializer):
+    """Serialize a list of news, fetching buffered upvotes in one call"""
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.Manager) else data
+        items = list(items)
+        if "up_votes" in self.child.fields:
+            self.child.live_upvotes = votes.live_upvotes(items)
+        try:
+            return super().to_representation(items)
+        finally:
+            self.child.live_upvotes = None
+
+    def create(self, validated_data):
+        """insert the news with one query per NEWS_BULK_BATCH_SIZE of them"""
+        return News.objects.bulk_create(
+            [News(**attrs) for attrs in validated_data],
+            batch_size=settings.NEWS_BULK_BATCH_SIZE,
+        )
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+    """Serialize the author of news or comments"""
+
+    class Meta:
+        model = get_user_model()
+        fields = ("id", "name")
+        read_only_fields = ("id", "name")
 
 
 class NewsSerializer(serializers.ModelSerializer):
-    """Serialize news"""
+    """Serialize news, only the given fields when fields is not None and
+    the relations in expand as objects"""
 
     author = serializers.StringRelatedField(many=False, read_only=True)
     comment_news = serializers.StringRelatedField(many=True, read_only=True)
 
+    live_upvotes = None
+    expandable = {
+        "author": lambda: AuthorSerializer(read_only=True),
+        "comment_news": lambda: CommentSerializer(many=True, read_only=True),
+    }
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in expand:
+            if name in self.fields:
+                self.fields[name] = self.expandable[name]()
+
+    def to_representation(self, instance):
+        """show today's upvotes, including those still buffered in redis"""
+        data = super().to_representation(instance)
+        if "up_votes" not in data:
+            return data
+        live = self.live_upvotes
+        if live is None:
+            live = votes.live_upvotes([instance])
+        data["up_votes"] = live[instance.pk]
+        return data
+
+    def validate(self, attrs):
+        """hash the normalized link, a changed link must stay unique"""
+        if "link" in attrs:
+            attrs["link_hash"] = links.link_hash(attrs["link"])
+            if self.instance is not None and News.objects.filter(
+                link_hash=attrs["link_hash"]
+            ).exclude(pk=self.instance.pk).exists():
+                raise serializers.ValidationError(
+                    {"link": ["News with this link already exists."]}
+                )
+        return attrs
+
     class Meta:
         model = News
+        list_serializer_class = NewsListSerializer
         fields = (
             "id",
             "title",
@@ -18,6 +92,7 @@ class NewsSerializer(serializers.ModelSerializer):
             "author",
             "link",
             "up_votes",
+            "comment_count",
             "comment_news",
         )
         read_only_fields = (
@@ -25,20 +100,56 @@ class NewsSerializer(serializers.ModelSerializer):
             "created_at",
             "author",
             "up_votes",
+            "comment_count",
             "comment_news"
         )
 
 
+class NewsSlimSerializer(NewsSerializer):
+    """Serialize news with the number of comments instead of the comments"""
+
+    class Meta(NewsSerializer.Meta):
+        fields = tuple(
+            field for field in NewsSerializer.Meta.fields
+            if field != "comment_news"
+        )
+
+
 class CommentSerializer(serializers.ModelSerializer):
     """Serialize news"""
 
     author = serializers.StringRelatedField(many=False, read_only=True)
 
+    def validate(self, attrs):
+        """a reply goes under a comment of the same news, not too deep"""
+        parent = attrs.get("parent")
+        if parent is None or self.instance is not None:
+            return attrs
+        if parent.news_id != attrs["news"].pk:
+            raise serializers.ValidationError(
+                {"parent": ["Reply to a comment of the same news."]}
+            )
+        if threads.depth_of(parent) + 1 >= MAX_DEPTH:
+            raise serializers.ValidationError(
+                {"parent": [f"Replies nest at most {MAX_DEPTH} deep."]}
+            )
+        return attrs
+
     def update(self, instance, validated_data):
         validated_data.pop("news", None)
+        validated_data.pop("parent", None)
         return super().update(instance, validated_data)
 
     class Meta:
         model = Comment
-        fields = ("id", "author", "news", "content", "created_at")
+        fields = ("id", "author", "news", "parent", "content", "created_at")
         read_only_fields = ("id", "author", "created_at")
+
+
+class DailyVotesSerializer(serializers.ModelSerializer):
+    """Serialize the upvotes of a news on one day"""
+
+    class Meta:
+        model = DailyVotes
+        fields = ("epoch", "up_votes")
+        read_only_fields = ("epoch", "up_votes")
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import cache, changes, events
+from core.models import Change, Comment, News
+from core.serializers import CommentSerializer, NewsSlimSerializer
+
+
+@receiver((post_save, post_delete), sender=News)
+def invalidate_news(sender, instance, **kwargs):
+    """drop cached responses showing the news"""
+    cache.invalidate(cache.LIST_SCOPE, cache.news_scope(instance.pk))
+
+
+@receiver((post_save, post_delete), sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    """drop cached responses showing the comment or its news"""
+    cache.invalidate(
+        cache.LIST_SCOPE,
+        cache.news_scope(instance.news_id),
+        cache.comments_scope(instance.news_id),
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author(sender, created, update_fields, **kwargs):
+    """drop every cached response when a name shown as author may change"""
+    if created or update_fields is not None and "name" not in update_fields:
+        return
+    cache.invalidate(cache.ALL_SCOPE)
+
+
+@receiver(post_save, sender=News)
+def publish_news(sender, instance, created, **kwargs):
+    """send new news to the event streams"""
+    if created:
+        data = NewsSlimSerializer(instance).data
+        events.send_event("news", instance.pk, data)
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment(sender, instance, created, **kwargs):
+    """send new comments to the event streams"""
+    if created:
+        data = CommentSerializer(instance).data
+        events.send_event("comment", instance.news_id, data)
+
+
+@receiver((post_save, post_delete), sender=News)
+@receiver((post_save, post_delete), sender=Comment)
+def record_change(sender, instance, signal, created=False, raw=False,
+                  **kwargs):
+    """log the write to the change feed, in its transaction"""
+    if raw:
+        return
+    if signal is post_delete:
+        action = Change.DELETED
+    else:
+        action = Change.CREATED if created else Change.UPDATED
+    changes.record([instance], action)
@@ -1,8 +1,55 @@
+import time
+
 from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+
+from core import changes, trending, votes
 
-from core.models import News
+logger = get_task_logger(__name__)
 
 
 @shared_task(bind=True)
 def reset_upvote(self):
-    News.objects.all().update(up_votes=0)
+    """start a new voting day, older counts now read as 0"""
+    return votes.advance_epoch().isoformat()
+
+
+@shared_task(bind=True, acks_late=True)
+def compact_votes(self):
+    """clean up rows of past voting days, resuming an interrupted run"""
+
+    def report(state):
+        logger.info(
+            "compact_votes: %(rows)d rows in %(batches)d batches, "
+            "step %(step)d, last id %(last_id)d", state
+        )
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta=state)
+
+    state = votes.compact_votes(
+        batch_size=settings.VOTE_COMPACT_BATCH_SIZE,
+        history_days=settings.VOTE_HISTORY_DAYS,
+        progress=report,
+    )
+    state["duration"] = round(time.time() - state.pop("started"), 3)
+    logger.info(
+        "compact_votes finished: %(rows)d rows in %(batches)d batches, "
+        "%(duration).3fs", state
+    )
+    return state
+
+
+@shared_task(bind=True)
+def flush_upvotes(self):
+    return votes.flush_upvotes()
+
+
+@shared_task(bind=True)
+def refresh_trending(self):
+    return trending.refresh_trending()
+
+
+@shared_task(bind=True)
+def prune_changes(self):
+    return changes.prune_changes(settings.CHANGES_PRUNE_BATCH_SIZE)
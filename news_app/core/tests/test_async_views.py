@@ -0,0 +1,76 @@
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import resolve, reverse
+from rest_framework.authtoken.models import Token
+
+from core.tests.test_cache import comments_url
+from core.tests.test_news_api import (
+    NEWS_URLS,
+    clear_vote_state,
+    detail_url,
+    sample_news,
+)
+from user.authentication import local_tokens
+
+
+class AsyncReadTests(TestCase):
+    """test list and retrieve are served by async views"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.token = Token.objects.create(user=self.user)
+        # the async test client of django 3.2 takes raw header names
+        self.auth = {"authorization": f"Token {self.token.key}"}
+        local_tokens.clear()
+        clear_vote_state()
+        self.news = sample_news(user=self.user)
+
+    def test_only_reads_async(self):
+        """test list and retrieve views are async, the others sync"""
+        reads = [NEWS_URLS, detail_url(self.news.id),
+                 comments_url(self.news.id)]
+        others = [reverse("core:news-trending"),
+                  reverse("core:news-upvote", args=[self.news.id])]
+
+        for url in reads:
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+        for url in others:
+            self.assertFalse(asyncio.iscoroutinefunction(resolve(url).func))
+
+    async def test_cached_read(self):
+        """test a cached response is served on the event loop"""
+        first = await self.async_client.get(NEWS_URLS, **self.auth)
+        second = await self.async_client.get(NEWS_URLS, **self.auth)
+        not_modified = await self.async_client.get(
+            NEWS_URLS, **{"if-none-match": second["ETag"]}, **self.auth
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(second["Allow"], first["Allow"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_unknown_token_rejected(self):
+        """test a token the caches do not know is checked by the sync view"""
+        res = await self.async_client.get(
+            detail_url(self.news.id), authorization="Token nope"
+        )
+
+        self.assertEqual(res.status_code, 401)
+
+    async def test_writes_stay_sync(self):
+        """test a write through an async view still runs the sync view"""
+        res = await self.async_client.post(
+            NEWS_URLS,
+            {"title": "Fresh", "link": "https://fresh.io"},
+            content_type="application/json",
+            **self.auth,
+        )
+
+        self.assertEqual(res.status_code, 201)
@@ -0,0 +1,193 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import links, views, votes
+from core.models import News
+from core.tests.test_news_api import NEWS_URLS, clear_vote_state
+
+BULK_URL = reverse("core:news-bulk")
+
+
+def sample_items(count):
+    """return count valid news payloads"""
+    return [
+        {"title": f"News {number}", "link": f"https://news.io/{number}"}
+        for number in range(count)
+    ]
+
+
+class BulkNewsApiTests(TestCase):
+    """test creating news in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+
+    @override_settings(NEWS_BULK_BATCH_SIZE=2)
+    def test_bulk_create_in_batches(self):
+        """test a list is inserted with one query per batch"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BULK_URL, sample_items(5), format="json")
+
+        inserts = [
+            query for query in queries
+            if query["sql"].startswith('INSERT INTO "core_news"')
+        ]
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(res.data["created"], 5)
+        news = News.objects.order_by("id")
+        self.assertEqual([result["id"] for result in res.data["results"]],
+                         [item.id for item in news])
+        self.assertTrue(all(item.author == self.user for item in news))
+
+    def test_bulk_create_ndjson(self):
+        """test news can be streamed as newline delimited JSON"""
+        body = "\n".join(json.dumps(item) for item in sample_items(3))
+
+        res = self.client.post(
+            BULK_URL, body + "\n", content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(News.objects.count(), 3)
+
+    def test_ndjson_parse_error(self):
+        """test a broken line is reported by its number"""
+        res = self.client.post(
+            BULK_URL, '{"title": "One", "link": "https://one.io"}\n{oops\n',
+            content_type="application/x-ndjson",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("line 2", res.data["detail"])
+        self.assertFalse(News.objects.exists())
+
+    def test_partial_failure_kept(self):
+        """test valid items are created next to invalid ones"""
+        items = sample_items(3)
+        items[1]["link"] = "not a link"
+
+        res = self.client.post(BULK_URL, items, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result["status"] for result in res.data["results"]],
+            [201, 400, 201],
+        )
+        self.assertIn("link", res.data["results"][1]["errors"])
+        self.assertEqual(News.objects.count(), 2)
+
+    def test_concurrent_duplicate_fails_alone(self):
+        """test a link stored by another request after the duplicate probe
+        fails its own item, not the rest of its batch"""
+        items = sample_items(3)
+        create_news = views._create_news
+
+        def store_first(serializer, rows):
+            if not News.objects.exists():
+                News.objects.create(
+                    author=self.user, title="Raced", link=items[1]["link"],
+                    link_hash=links.link_hash(items[1]["link"]),
+                )
+            return create_news(serializer, rows)
+
+        with mock.patch.object(views, "_create_news", store_first):
+            res = self.client.post(BULK_URL, items, format="json")
+
+        raced = News.objects.get(title="Raced")
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result["status"] for result in res.data["results"]],
+            [201, 409, 201],
+        )
+        self.assertEqual(res.data["results"][1]["id"], raced.id)
+        self.assertEqual(News.objects.count(), 3)
+
+    def test_atomic_rolls_back_all(self):
+        """test ?atomic=true creates nothing when an item is invalid"""
+        items = sample_items(3)
+        items[2]["title"] = ""
+
+        res = self.client.post(f"{BULK_URL}?atomic=true", items,
+                               format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [result["status"] for result in res.data["results"]],
+            [424, 424, 400],
+        )
+        self.assertFalse(News.objects.exists())
+
+    def test_atomic_conflict_rolls_back_all(self):
+        """test ?atomic=true creates nothing and merges no repeat when a
+        link is stored by another request after the duplicate probe"""
+        stored = News.objects.create(
+            author=self.user, title="Stored", link="https://news.io/stored",
+            link_hash=links.link_hash("https://news.io/stored"),
+        )
+        items = sample_items(3) + [{"title": "Again", "link": stored.link}]
+        create_news = views._create_news
+
+        def store_second(serializer, rows):
+            News.objects.create(
+                author=self.user, title="Raced", link=items[1]["link"],
+                link_hash=links.link_hash(items[1]["link"]),
+            )
+            return create_news(serializer, rows)
+
+        with mock.patch.object(views, "_create_news", store_second):
+            res = self.client.post(
+                f"{BULK_URL}?atomic=true&on_duplicate=merge", items,
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            [result["status"] for result in res.data["results"]],
+            [424, 409, 424, 424],
+        )
+        self.assertEqual(res.data["created"], 0)
+        self.assertEqual(
+            sorted(News.objects.values_list("title", flat=True)),
+            ["Raced", "Stored"],
+        )
+        self.assertEqual(
+            votes.pending_upvotes([stored.id], votes.current_epoch()), {}
+        )
+
+    @override_settings(NEWS_BULK_MAX_ITEMS=2)
+    def test_too_many_items(self):
+        """test a request over the item limit is refused"""
+        res = self.client.post(BULK_URL, sample_items(3), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(News.objects.exists())
+
+    def test_list_not_accepted_as_object(self):
+        """test a single object is refused"""
+        res = self.client.post(BULK_URL, sample_items(1)[0], format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_list_invalidated(self):
+        """test created news show up in a list read before"""
+        self.client.get(NEWS_URLS)
+
+        self.client.post(BULK_URL, sample_items(2), format="json")
+        res = self.client.get(NEWS_URLS)
+
+        self.assertEqual(len(res.data["results"]), 2)
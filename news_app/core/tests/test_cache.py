@@ -0,0 +1,239 @@
+import threading
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import cache
+from core.models import News
+from core.tests.test_news_api import (
+    NEWS_URLS,
+    clear_vote_state,
+    detail_url,
+    sample_news,
+    upvote_url,
+)
+
+
+def comments_url(news_id):
+    """return the comment list url of a news"""
+    return f"{detail_url(news_id)}comment/"
+
+
+def cached_keys(pattern="news:cache:news:*"):
+    """return the cached response keys matching pattern"""
+    redis = get_redis_connection()
+    return [
+        key for key in redis.scan_iter(match=pattern)
+        if not key.endswith(b":lock")
+    ]
+
+
+class ResponseCacheTests(TestCase):
+    """test rendered responses are cached and invalidated on writes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+            name="Tester",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        keys = cached_keys("news:cache:*")
+        if keys:
+            get_redis_connection().delete(*keys)
+        self.news = sample_news(user=self.user)
+
+    def test_list_cached(self):
+        """test a repeated list request is served without queries"""
+        first = self.client.get(NEWS_URLS)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(NEWS_URLS)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+
+    def test_create_invalidates_list(self):
+        """test a new news shows up in a cached list"""
+        self.client.get(NEWS_URLS)
+
+        self.client.post(NEWS_URLS, {"title": "Fresh", "link": "https://a.io"})
+        res = self.client.get(NEWS_URLS)
+
+        self.assertEqual(len(res.json()["results"]), 2)
+
+    def test_comment_invalidates_news_and_comments(self):
+        """test a new comment shows up in the cached news and comments"""
+        self.client.get(detail_url(self.news.id))
+        self.client.get(comments_url(self.news.id))
+
+        self.client.post(
+            comments_url(self.news.id),
+            {"news": self.news.id, "content": "First"},
+        )
+        news = self.client.get(detail_url(self.news.id)).json()
+        comments = self.client.get(comments_url(self.news.id)).json()
+
+        self.assertEqual(news["comment_count"], 1)
+        self.assertEqual(len(comments["results"]), 1)
+
+    def test_upvote_invalidates_news(self):
+        """test an upvote shows up in the cached news and list"""
+        self.client.get(detail_url(self.news.id))
+        self.client.get(NEWS_URLS)
+
+        self.client.get(upvote_url(self.news.id))
+
+        news = self.client.get(detail_url(self.news.id)).json()
+        listed = self.client.get(NEWS_URLS).json()["results"][0]
+        self.assertEqual(news["up_votes"], 1)
+        self.assertEqual(listed["up_votes"], 1)
+
+    def test_rename_invalidates_author(self):
+        """test a renamed author shows up in cached responses"""
+        self.client.get(detail_url(self.news.id))
+
+        self.user.name = "Renamed"
+        self.user.save()
+        res = self.client.get(detail_url(self.news.id))
+
+        self.assertEqual(res.json()["author"], "Renamed")
+
+    def test_only_json_success_cached(self):
+        """test errors and the browsable api are not cached"""
+        self.client.get(detail_url(self.news.id + 1))
+        self.client.get(NEWS_URLS, {"format": "api"})
+
+        self.assertEqual(cached_keys(), [])
+
+    @override_settings(RESPONSE_CACHE_WAIT=5)
+    def test_waits_for_recompute(self):
+        """test a miss waits for the request already recomputing it"""
+        self.client.get(NEWS_URLS)
+        key, = cached_keys("news:cache:news:list:*")
+        redis = get_redis_connection()
+        body = redis.get(key)
+        redis.delete(key)
+        lock = redis.lock(f"{key.decode()}:lock", timeout=5)
+        lock.acquire()
+        timer = threading.Timer(0.2, redis.set, (key, body))
+        timer.start()
+
+        try:
+            with self.assertNumQueries(0):
+                res = self.client.get(NEWS_URLS)
+        finally:
+            timer.join()
+            lock.release()
+
+        self.assertEqual(res.content, body)
+
+    @override_settings(RESPONSE_CACHE_WAIT=0.1)
+    def test_recomputes_after_wait(self):
+        """test a miss is recomputed when the lock holder takes too long"""
+        self.client.get(NEWS_URLS)
+        key, = cached_keys("news:cache:news:list:*")
+        redis = get_redis_connection()
+        redis.delete(key)
+        lock = redis.lock(f"{key.decode()}:lock", timeout=5)
+        lock.acquire()
+
+        try:
+            res = self.client.get(NEWS_URLS)
+        finally:
+            lock.release()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()["results"]), 1)
+
+
+class ConditionalGetTests(TestCase):
+    """test ETag and Last-Modified validators of news and comments"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        self.news = sample_news(user=self.user)
+
+    def test_etag_not_modified(self):
+        """test a matching If-None-Match gets a 304 without queries"""
+        etag = self.client.get(detail_url(self.news.id))["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                detail_url(self.news.id), HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(res.content, b"")
+
+    def test_etag_changes_on_write(self):
+        """test a stale ETag gets the new content"""
+        etag = self.client.get(comments_url(self.news.id))["ETag"]
+
+        self.client.post(
+            comments_url(self.news.id),
+            {"news": self.news.id, "content": "First"},
+        )
+        res = self.client.get(
+            comments_url(self.news.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(len(res.json()["results"]), 1)
+
+    def test_etag_changes_on_recount(self):
+        """test recounting comments makes the cached counts stale"""
+        News.objects.filter(pk=self.news.pk).update(comment_count=3)
+        etag = self.client.get(detail_url(self.news.id))["ETag"]
+
+        call_command("recount_comments", stdout=StringIO())
+        res = self.client.get(detail_url(self.news.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["comment_count"], 0)
+
+    def test_etag_per_url(self):
+        """test pages of the list have their own ETags"""
+        first = self.client.get(NEWS_URLS)["ETag"]
+        slim = self.client.get(NEWS_URLS, {"slim": "true"})["ETag"]
+
+        self.assertNotEqual(first, slim)
+
+    def test_last_modified(self):
+        """test If-Modified-Since with the time of the last change"""
+        changed = time.time() - 60
+        redis = get_redis_connection()
+        for scope in (cache.ALL_SCOPE, cache.news_scope(self.news.id)):
+            redis.set(cache.MODIFIED_KEY.format(scope=scope), changed)
+        res = self.client.get(detail_url(self.news.id))
+
+        self.assertEqual(res["Last-Modified"], http_date(int(changed)))
+        res = self.client.get(
+            detail_url(self.news.id),
+            HTTP_IF_MODIFIED_SINCE=res["Last-Modified"],
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_last_modified_settles(self):
+        """test no Last-Modified is sent within the second of a change"""
+        res = self.client.get(detail_url(self.news.id))
+
+        self.assertNotIn("Last-Modified", res)
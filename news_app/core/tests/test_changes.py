@@ -0,0 +1,207 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import changes, votes
+from core.models import Change, Comment
+from core.tests.test_bulk import BULK_URL, sample_items
+from core.tests.test_news_api import (
+    NEWS_URLS,
+    clear_vote_state,
+    detail_url,
+    sample_news,
+)
+
+CHANGES_URL = reverse("core:changes")
+
+
+@override_settings(CHANGES_SETTLE_SECONDS=0)
+class ChangeFeedApiTests(TestCase):
+    """test syncing news and comments from the change feed"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        get_redis_connection().delete(changes.PRUNED_KEY)
+
+    def feed(self, **params):
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.data)
+        return res.data
+
+    def test_auth_required(self):
+        """test the feed needs an authenticated user"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_news_writes_are_changes(self):
+        """test creating, updating and deleting a news are changes with
+        the news as it is now, deleting leaves a tombstone"""
+        res = self.client.post(
+            NEWS_URLS, {"title": "First", "link": "https://news.io/1"}
+        )
+        news_id = res.data["id"]
+        self.client.patch(detail_url(news_id), {"title": "Second"})
+
+        data = self.feed()
+
+        self.assertEqual(
+            [(change["type"], change["id"], change["action"])
+             for change in data["results"]],
+            [("news", news_id, "created"), ("news", news_id, "updated")],
+        )
+        self.assertEqual(data["results"][0]["data"]["title"], "Second")
+        self.assertEqual(data["since"], data["results"][-1]["seq"])
+        self.assertFalse(data["more"])
+
+        self.client.delete(detail_url(news_id))
+        data = self.feed(since=data["since"])
+
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(data["results"][0]["action"], "deleted")
+        self.assertIsNone(data["results"][0]["data"])
+
+    def test_comment_writes_are_changes(self):
+        """test comments are changes, deleting a news leaves tombstones of
+        its comments"""
+        news = sample_news(user=self.user)
+        since = self.feed()["since"]
+        res = self.client.post(
+            f"{detail_url(news.id)}comment/", {"news": news.id, "content": "Hi"}
+        )
+        news_id = news.id
+        news.delete()
+
+        results = self.feed(since=since)["results"]
+
+        self.assertEqual(
+            [(change["type"], change["id"], change["action"])
+             for change in results],
+            [("comment", res.data["id"], "created"),
+             ("news", news_id, "updated"),
+             ("comment", res.data["id"], "deleted"),
+             ("news", news_id, "deleted")],
+        )
+
+    def test_counters_are_changes(self):
+        """test comments and flushed upvotes of a news record an update of
+        it, with its new counts"""
+        news = sample_news(user=self.user)
+        since = self.feed()["since"]
+        res = self.client.post(
+            f"{detail_url(news.id)}comment/", {"news": news.id, "content": "Hi"}
+        )
+        votes.record_upvote(news.id, self.user.id)
+        votes.flush_upvotes()
+        self.client.delete(f"{detail_url(news.id)}comment/{res.data['id']}/")
+
+        results = self.feed(since=since)["results"]
+
+        self.assertEqual(
+            [(change["type"], change["action"]) for change in results],
+            [("comment", "created"), ("news", "updated"),
+             ("news", "updated"),
+             ("comment", "deleted"), ("news", "updated")],
+        )
+        self.assertEqual(results[1]["data"]["up_votes"], 1)
+        self.assertEqual(results[1]["data"]["comment_count"], 0)
+
+    def test_bulk_created_news_are_changes(self):
+        """test news created in bulk are changes too"""
+        self.client.post(BULK_URL, sample_items(3), format="json")
+
+        results = self.feed()["results"]
+
+        self.assertEqual([change["action"] for change in results],
+                         ["created"] * 3)
+        self.assertEqual(results[0]["data"]["title"], "News 0")
+
+    def test_feed_pages(self):
+        """test a client syncs in pages by the last sequence number"""
+        for number in range(3):
+            sample_news(user=self.user, link=f"https://news.io/{number}")
+
+        first = self.feed(limit=2)
+        second = self.feed(since=first["since"], limit=2)
+
+        self.assertTrue(first["more"])
+        self.assertEqual(len(first["results"]), 2)
+        self.assertFalse(second["more"])
+        self.assertEqual(len(second["results"]), 1)
+        self.assertEqual(second["since"], second["results"][0]["seq"])
+        self.assertEqual(self.feed(since=second["since"])["results"], [])
+
+    def test_since_time(self):
+        """test the changes after a time can be asked for"""
+        sample_news(user=self.user, link="https://news.io/1")
+        moment = timezone.now()
+        news = sample_news(user=self.user, link="https://news.io/2")
+
+        results = self.feed(since_time=moment.isoformat())["results"]
+
+        self.assertEqual([change["id"] for change in results], [news.id])
+        res = self.client.get(CHANGES_URL, {
+            "since": 0, "since_time": moment.isoformat(),
+        })
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CHANGES_SETTLE_SECONDS=60)
+    def test_young_changes_wait(self):
+        """test changes younger than the settle window are not served"""
+        sample_news(user=self.user)
+
+        data = self.feed(since=0)
+
+        self.assertEqual(data["results"], [])
+        self.assertEqual(data["since"], 0)
+        self.assertTrue(data["more"])
+
+    @override_settings(CHANGES_RETENTION_DAYS=30)
+    def test_pruned_changes_are_gone(self):
+        """test old changes are pruned and a client behind them told to
+        sync from scratch"""
+        for number in range(3):
+            sample_news(user=self.user, link=f"https://news.io/{number}")
+        old = list(Change.objects.order_by("id"))[:2]
+        Change.objects.filter(id__in=[change.id for change in old]).update(
+            created_at=timezone.now() - timedelta(days=31)
+        )
+
+        self.assertEqual(changes.prune_changes(batch_size=1), 2)
+
+        self.assertEqual(Change.objects.count(), 1)
+        for params in ({"since": 0},
+                       {"since_time": timezone.now() - timedelta(days=40)}):
+            with self.subTest(params):
+                res = self.client.get(CHANGES_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.assertEqual(len(self.feed(since=old[-1].id)["results"]), 1)
+        # a client without a sequence number starts after the pruned ones
+        data = self.feed()
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(data["results"][0]["seq"], old[-1].id + 1)
+
+    def test_loaded_rows_are_not_changes(self):
+        """test a row saved by loaddata is not logged"""
+        news = sample_news(user=self.user)
+        Change.objects.all().delete()
+
+        Comment(
+            author=self.user, news=news, content="Hi",
+            created_at=timezone.now(),
+        ).save_base(raw=True)
+
+        self.assertFalse(Change.objects.exists())
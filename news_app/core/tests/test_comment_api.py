@@ -1,4 +1,7 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
@@ -6,6 +9,7 @@ from rest_framework.test import APIClient
 
 from core.models import News, Comment
 from core.serializers import CommentSerializer
+from core.tests.test_news_api import assert_constant_queries, clear_vote_state
 
 NEWS_URLS = reverse("core:news-list")
 
@@ -64,6 +68,7 @@ class PrivateNewsApiTests(TestCase):
             password="testpass",
         )
         self.client.force_authenticate(self.user)
+        clear_vote_state()
 
     def test_retrieve_comments(self):
         """test retrieving a list of comments"""
@@ -76,11 +81,45 @@ class PrivateNewsApiTests(TestCase):
 
         url = detail_url(news.id)
         res = self.client.get(f"{url}comment", follow=True)
-        comment = Comment.objects.filter(news=news).order_by("id")
+        comment = Comment.objects.filter(news=news).order_by(
+            "-created_at", "-id"
+        )
         serializer = CommentSerializer(comment, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_retrieve_comments_constant_queries(self):
+        """test listing comments does not issue a query per comment"""
+        news = sample_news(user=self.user)
+        sample_comment(user=self.user, news=news)
+        user2 = get_user_model().objects.create_user(
+            email="other@mail.com", password="otherpass"
+        )
+        url = f"{detail_url(news.id)}comment/"
+
+        def add_rows():
+            sample_comment(user=user2, news=news)
+            sample_comment(user=self.user, news=news)
+
+        assert_constant_queries(self, url, add_rows)
+
+    def test_comment_cursor_pagination(self):
+        """test walking a comment thread page by page with cursors"""
+        news = sample_news(user=self.user)
+        other = sample_news(user=self.user)
+        comments = [sample_comment(user=self.user, news=news)
+                    for _ in range(3)]
+        sample_comment(user=self.user, news=other)
+
+        url = f"{detail_url(news.id)}comment/?page_size=2"
+        first = self.client.get(url)
+        second = self.client.get(first.data["next"])
+
+        ids = [item["id"] for item in first.data["results"]]
+        ids += [item["id"] for item in second.data["results"]]
+        self.assertEqual(ids, [c.id for c in reversed(comments)])
+        self.assertIsNone(second.data["next"])
 
     def test_view_comment_detail(self):
         """test viewing a comment detail"""
@@ -93,6 +132,45 @@ class PrivateNewsApiTests(TestCase):
 
         self.assertEqual(res.data, serializer.data)
 
+    def test_create_comment_counts(self):
+        """test creating a comment increments the news comment count"""
+        news = sample_news(user=self.user)
+        url = f"{detail_url(news.id)}comment/"
+
+        res = self.client.post(url, {"content": "Hi", "news": news.id})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        news.refresh_from_db()
+        self.assertEqual(news.comment_count, 1)
+
+    def test_delete_comment_counts(self):
+        """test deleting a comment decrements the news comment count"""
+        news = sample_news(user=self.user, comment_count=1)
+        comment = sample_comment(user=self.user, news=news)
+        url = f"{detail_url(news.id)}comment/{comment.id}/"
+
+        self.client.delete(url)
+
+        news.refresh_from_db()
+        self.assertEqual(news.comment_count, 0)
+
+    def test_recount_comments(self):
+        """test the repair command recomputes drifted counts"""
+        news = sample_news(user=self.user, comment_count=7)
+        sample_comment(user=self.user, news=news)
+        sample_comment(user=self.user, news=news)
+        empty = sample_news(user=self.user, comment_count=2)
+        exact = sample_news(user=self.user, comment_count=1)
+        sample_comment(user=self.user, news=exact)
+        out = StringIO()
+
+        call_command("recount_comments", "--batch-size=2", stdout=out)
+
+        for item, expected in ((news, 2), (empty, 0), (exact, 1)):
+            item.refresh_from_db()
+            self.assertEqual(item.comment_count, expected)
+        self.assertIn("2 news", out.getvalue())
+
     def test_full_update_comment(self):
         """test full update a comment"""
         news = sample_news(user=self.user)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import events
+from core.models import Comment
+from core.tests.test_news_api import clear_vote_state, sample_news
+from user.authentication import local_tokens, remember_token
+
+
+class EventStream:
+    """drive the event stream app as an ASGI server would"""
+
+    def __init__(self, query="", headers=()):
+        self.scope = {
+            "type": "http",
+            "path": "/api/events/",
+            "query_string": query.encode(),
+            "headers": [
+                (name.encode(), value.encode()) for name, value in headers
+            ],
+        }
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        await self.messages.put(message)
+
+    def open(self):
+        self.task = asyncio.ensure_future(
+            events.event_stream(self.scope, self.receive, self.send)
+        )
+
+    async def read(self):
+        """return the next message sent within a second"""
+        return await asyncio.wait_for(self.messages.get(), timeout=1)
+
+    async def read_event(self):
+        """return the next event as a {field: value} mapping"""
+        while True:
+            body = (await self.read()).get("body", b"").decode()
+            if body and not body.startswith(("retry:", ":")):
+                break
+        return dict(
+            line.split(": ", 1) for line in body.strip().splitlines()
+        )
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, timeout=2)
+
+
+class EventStreamTests(TestCase):
+    """test the server-sent events stream"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.token = Token.objects.create(user=self.user)
+        # the stream checks tokens in the caches without the database
+        local_tokens.clear()
+        remember_token(self.token.key, self.user)
+        clear_vote_state()
+        get_redis_connection().delete(events.EVENTS_STREAM_KEY)
+        self.news = sample_news(user=self.user)
+        self.other = sample_news(user=self.user, title="Other")
+
+    def publish(self, event, news_id, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            events.send_event(event, news_id, data)
+
+    async def test_token_required(self):
+        """test a stream without a valid token is refused"""
+        for query in ("", "token=nope"):
+            stream = EventStream(query)
+            stream.open()
+
+            start = await stream.read()
+
+            self.assertEqual(start["status"], 401)
+            await stream.close()
+
+    async def test_new_comment_streamed(self):
+        """test a comment created while connected is pushed"""
+        stream = EventStream(
+            headers=[("authorization", f"Token {self.token.key}")]
+        )
+        stream.open()
+        start = await stream.read()
+        retry = await stream.read()
+
+        def comment():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Comment.objects.create(
+                    author=self.user, news=self.news, content="First"
+                )
+
+        created = await sync_to_async(comment)()
+        event = await stream.read_event()
+        await stream.close()
+
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"),
+                      start["headers"])
+        self.assertTrue(retry["body"].startswith(b"retry: "))
+        self.assertEqual(event["event"], "comment")
+        self.assertEqual(json.loads(event["data"])["id"], created.id)
+
+    async def test_resume_from_last_event_id(self):
+        """test a reconnecting client gets the events it missed, once"""
+        publish = sync_to_async(self.publish)
+        await publish("news", self.news.id, {"id": self.news.id})
+        await publish("news", self.other.id, {"id": self.other.id})
+        first, second = get_redis_connection().xrange(
+            events.EVENTS_STREAM_KEY
+        )
+        stream = EventStream(
+            f"token={self.token.key}",
+            headers=[("last-event-id", first[0].decode())],
+        )
+        stream.open()
+
+        missed = await stream.read_event()
+        await publish("upvotes", self.news.id, {"id": self.news.id})
+        live = await stream.read_event()
+        await stream.close()
+
+        self.assertEqual(missed["id"], second[0].decode())
+        self.assertEqual(json.loads(missed["data"]), {"id": self.other.id})
+        self.assertEqual(live["event"], "upvotes")
+
+    async def test_invalid_last_event_id_ignored(self):
+        """test a stream with a malformed Last-Event-ID streams live events
+        only"""
+        publish = sync_to_async(self.publish)
+        await publish("news", self.news.id, {"id": self.news.id})
+        stream = EventStream(
+            f"token={self.token.key}", headers=[("last-event-id", "abc")]
+        )
+        stream.open()
+        start = await stream.read()
+
+        await publish("news", self.other.id, {"id": self.other.id})
+        event = await stream.read_event()
+        await stream.close()
+
+        self.assertEqual(start["status"], 200)
+        self.assertEqual(json.loads(event["data"]), {"id": self.other.id})
+
+    async def test_news_filter(self):
+        """test a stream of one news skips the events of others"""
+        publish = sync_to_async(self.publish)
+        stream = EventStream(f"token={self.token.key}&news={self.news.id}")
+        stream.open()
+        await stream.read()
+
+        await publish("comment", self.other.id, {"id": 1})
+        await publish("comment", self.news.id, {"id": 2})
+        event = await stream.read_event()
+        await stream.close()
+
+        self.assertEqual(json.loads(event["data"]), {"id": 2})
+
+    def test_upvote_published(self):
+        """test an upvote sends the new count of the news"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.get(reverse("core:news-upvote", args=[self.news.id]))
+
+        [(_, fields)] = get_redis_connection().xrange(
+            events.EVENTS_STREAM_KEY
+        )
+        self.assertEqual(fields[b"event"], b"upvotes")
+        self.assertEqual(json.loads(fields[b"data"]),
+                         {"id": self.news.id, "up_votes": 1})
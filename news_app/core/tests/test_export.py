@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Comment
+from core.tests.test_news_api import sample_news
+
+NEWS_EXPORT_URL = reverse("core:export", args=["news"])
+COMMENTS_EXPORT_URL = reverse("core:export", args=["comments"])
+
+
+def read_lines(res):
+    return b"".join(res.streaming_content).decode().splitlines()
+
+
+class ExportApiTests(TestCase):
+    """test streaming the news and comment tables"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            email="staff@mail.com", password="testpass"
+        )
+        self.client.force_authenticate(self.staff)
+        self.news = [
+            sample_news(user=self.staff, title=f"News {number}",
+                        link=f"https://news.io/{number}")
+            for number in range(3)
+        ]
+
+    def test_export_requires_staff(self):
+        """test only staff can export"""
+        user = get_user_model().objects.create_user(
+            email="test@mail.com", password="testpass"
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(NEWS_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_news_ndjson(self):
+        """test every news is streamed as a line of JSON, oldest first"""
+        res = self.client.get(NEWS_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in read_lines(res)]
+        self.assertEqual([row["id"] for row in rows],
+                         [news.id for news in self.news])
+        self.assertEqual(rows[0]["title"], "News 0")
+        self.assertEqual(rows[0]["author_id"], self.staff.id)
+        self.assertTrue(rows[0]["created_at"].endswith("Z"))
+
+    def test_export_comments_csv(self):
+        """test comments are streamed as CSV with a header"""
+        comment = Comment.objects.create(
+            author=self.staff, news=self.news[1], content="Hi, there"
+        )
+
+        res = self.client.get(COMMENTS_EXPORT_URL, {"output": "csv"})
+
+        self.assertEqual(res["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(read_lines(res)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["id"], str(comment.id))
+        self.assertEqual(rows[0]["news_id"], str(self.news[1].id))
+        self.assertEqual(rows[0]["content"], "Hi, there")
+
+    def test_export_since_watermark(self):
+        """test since exports only the rows created after it"""
+        since = self.news[0].created_at.isoformat()
+
+        res = self.client.get(NEWS_EXPORT_URL, {"since": since})
+
+        ids = [json.loads(line)["id"] for line in read_lines(res)]
+        self.assertEqual(ids, [news.id for news in self.news[1:]])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_chunks(self):
+        """test rows are handed out a chunk at a time"""
+        res = self.client.get(NEWS_EXPORT_URL, {"output": "csv"})
+
+        chunks = list(res.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0].decode().splitlines()[0].split(",")[0],
+                         "id")
+
+    def test_export_invalid_params(self):
+        """test an unknown output or a bad since are refused"""
+        for params in ({"output": "xml"}, {"since": "yesterday"}):
+            with self.subTest(params):
+                res = self.client.get(NEWS_EXPORT_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportCommandTests(TestCase):
+    """test the export_corpus command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com", password="testpass"
+        )
+        self.news = [
+            sample_news(user=self.user, title=f"News {number}",
+                        link=f"https://news.io/{number}")
+            for number in range(3)
+        ]
+
+    def test_export_to_stdout(self):
+        """test the rows go to stdout and the watermark to stderr"""
+        out, err = io.StringIO(), io.StringIO()
+
+        call_command("export_corpus", "news", stdout=out, stderr=err)
+
+        ids = [json.loads(line)["id"] for line in out.getvalue().splitlines()]
+        self.assertEqual(ids, [news.id for news in self.news])
+        self.assertIn("Exported 3 rows", err.getvalue())
+        self.assertIn(self.news[-1].created_at.isoformat(), err.getvalue())
+
+    def test_export_to_file_since(self):
+        """test an incremental export written to a file"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "news.csv")
+            call_command(
+                "export_corpus", "news", output="csv", file=path,
+                since=self.news[1].created_at.isoformat(), chunk_size=1,
+                stderr=io.StringIO(),
+            )
+            with open(path, newline="") as file:
+                rows = list(csv.DictReader(file))
+
+        self.assertEqual([row["id"] for row in rows], [str(self.news[2].id)])
+
+    def test_export_naive_since(self):
+        """test a since without a UTC offset is refused"""
+        with self.assertRaises(CommandError):
+            call_command("export_corpus", "news", since="2021-01-01T00:00")
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Comment
+from core.tests.test_news_api import (
+    NEWS_URLS,
+    clear_vote_state,
+    detail_url,
+    sample_news,
+)
+
+
+class SparseFieldsTests(TestCase):
+    """test ?fields= and ?expand= of news"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+            name="Tester",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        self.news = sample_news(user=self.user)
+        self.comment = Comment.objects.create(
+            author=self.user, news=self.news, content="First"
+        )
+
+    def test_fields_trim_payload_and_query(self):
+        """test only the fields asked for are read and returned"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(NEWS_URLS, {"fields": "id,title"})
+
+        [query] = [q["sql"] for q in queries]
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"],
+                         [{"id": self.news.id, "title": self.news.title}])
+        self.assertNotIn('"link"', query)
+        self.assertNotIn("search_vector", query)
+        self.assertNotIn("user_user", query)
+
+    def test_default_fields_unchanged(self):
+        """test without ?fields= every field is returned"""
+        res = self.client.get(detail_url(self.news.id))
+
+        self.assertEqual(res.data["author"], "Tester")
+        self.assertEqual(res.data["comment_news"], [str(self.comment)])
+        self.assertEqual(res.data["link"], self.news.link)
+
+    def test_fields_of_detail(self):
+        """test a detail honours ?fields= without loading comments"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(self.news.id),
+                                  {"fields": "link,up_votes"})
+
+        self.assertEqual(res.data, {"link": self.news.link, "up_votes": 0})
+        self.assertFalse(
+            any("core_comment" in q["sql"] for q in queries)
+        )
+
+    def test_expand(self):
+        """test ?expand= serializes relations as objects"""
+        res = self.client.get(
+            NEWS_URLS,
+            {"fields": "id,author,comment_news",
+             "expand": "author,comment_news"},
+        )
+
+        [news] = res.data["results"]
+        self.assertEqual(news["author"],
+                         {"id": self.user.id, "name": "Tester"})
+        self.assertEqual(news["comment_news"][0]["id"], self.comment.id)
+        self.assertEqual(news["comment_news"][0]["content"], "First")
+
+    def test_unknown_names_rejected(self):
+        """test unknown fields and relations are refused"""
+        for params in ({"fields": "id,password"}, {"expand": "votes"}):
+            with self.subTest(params):
+                res = self.client.get(NEWS_URLS, params)
+                self.assertEqual(res.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+    def test_slim_fields(self):
+        """test comments cannot be asked for from the slim list"""
+        res = self.client.get(
+            NEWS_URLS, {"slim": "true", "fields": "id,comment_news"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
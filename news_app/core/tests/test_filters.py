@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import votes
+from core.models import News
+from core.tests.test_news_api import NEWS_URLS, clear_vote_state, sample_news
+
+
+def result_ids(res):
+    """return the ids of a page of news"""
+    return [news["id"] for news in res.data["results"]]
+
+
+class NewsFilterTests(TestCase):
+    """test filtering and ordering the news list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.other = get_user_model().objects.create_user(
+            email="other@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        epoch = votes.current_epoch()
+        self.old = sample_news(self.user, title="Old")
+        self.popular = sample_news(self.other, title="Popular")
+        self.fresh = sample_news(self.user, title="Fresh")
+        News.objects.filter(pk=self.old.pk).update(
+            created_at=timezone.now() - timedelta(days=3),
+            up_votes=2, votes_epoch=epoch,
+        )
+        News.objects.filter(pk=self.popular.pk).update(
+            up_votes=5, votes_epoch=epoch
+        )
+        # counted on a past voting day, reads as no upvotes
+        News.objects.filter(pk=self.fresh.pk).update(
+            up_votes=9, votes_epoch=epoch - timedelta(days=1)
+        )
+
+    def test_filter_author(self):
+        """test news of one author, newest first"""
+        res = self.client.get(NEWS_URLS, {"author": self.user.id})
+
+        self.assertEqual(result_ids(res), [self.fresh.id, self.old.id])
+
+    def test_filter_created_range(self):
+        """test news created in a time range"""
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        newer = self.client.get(NEWS_URLS, {"created_after": since})
+        older = self.client.get(
+            NEWS_URLS, {"created_before": since, "ordering": "created_at"}
+        )
+
+        self.assertEqual(result_ids(newer), [self.fresh.id, self.popular.id])
+        self.assertEqual(result_ids(older), [self.old.id])
+
+    def test_order_by_up_votes(self):
+        """test ordering by today's upvotes, pages seeking on the count"""
+        first = self.client.get(
+            NEWS_URLS,
+            {"ordering": "-up_votes", "min_up_votes": 1, "page_size": 1},
+        )
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(result_ids(first), [self.popular.id])
+        self.assertEqual(result_ids(second), [self.old.id])
+        self.assertIsNone(second.data["next"])
+
+    def test_min_up_votes(self):
+        """test only news with enough upvotes today are listed"""
+        res = self.client.get(
+            NEWS_URLS, {"min_up_votes": 2, "ordering": "up_votes"}
+        )
+
+        self.assertEqual(result_ids(res), [self.old.id, self.popular.id])
+
+    def test_unindexed_sort_rejected(self):
+        """test combinations no index returns in order are refused"""
+        since = timezone.now().isoformat()
+        rejected = [
+            {"ordering": "title"},
+            {"ordering": "-up_votes", "created_after": since},
+            {"ordering": "-up_votes"},
+            {"min_up_votes": 2},
+            {"ordering": "-created_at", "q": "news"},
+            {"author": "me"},
+            {"min_up_votes": 0},
+        ]
+
+        for params in rejected:
+            with self.subTest(params):
+                res = self.client.get(NEWS_URLS, params)
+                self.assertEqual(res.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,204 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import links, search, threads, trending, votes
+from core.export import Export
+from core.models import Change, Comment, News
+from core.tests.test_news_api import (
+    NEWS_URLS,
+    clear_vote_state,
+    detail_url,
+    sample_news,
+)
+
+
+class QueryPlanTests(TestCase):
+    """test the main queries are served by indexes
+
+    A test database is far too small for the planner to prefer an index on
+    its own, so sequential scans and sorts are priced out before running
+    EXPLAIN. A scan or sort that still shows up in a plan has no index that
+    could replace it, and would read the whole table at scale.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        self.news = [sample_news(user=self.user) for _ in range(3)]
+        for news in self.news:
+            Comment.objects.create(author=self.user, news=news, content="Hi")
+            Comment.objects.create(author=self.user, news=news, content="Yo")
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def assertIndexed(self, sql, params=(), conditions=False):
+        """conditions checks every condition bounds an index scan, none
+        is a filter of the rows scanned"""
+        plan = self.explain(sql, params)
+        self.assertNotIn("Seq Scan", plan, f"{sql}\n{plan}")
+        self.assertNotRegex(plan, r"(?m)^\s*(->\s*)?Sort\b", f"{sql}\n{plan}")
+        if conditions:
+            self.assertNotIn("Filter:", plan, f"{sql}\n{plan}")
+
+    def assertRequestIndexed(self, url, params=None, conditions=False):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertIndexed(sql.replace("%", "%%"), conditions=conditions)
+        return res
+
+    def assertQuerysetIndexed(self, queryset):
+        self.assertIndexed(*queryset.query.sql_with_params())
+
+    def test_news_list(self):
+        """test news list pages are index range scans"""
+        first = self.assertRequestIndexed(NEWS_URLS, {"page_size": 2})
+        self.assertRequestIndexed(first.data["next"])
+        self.assertRequestIndexed(NEWS_URLS, {"slim": "true"})
+
+    def test_news_detail(self):
+        """test news detail is an index lookup"""
+        self.assertRequestIndexed(detail_url(self.news[0].id))
+
+    def test_comment_list(self):
+        """test comment pages of a news are index range scans"""
+        url = f"{detail_url(self.news[0].id)}comment/"
+        first = self.assertRequestIndexed(url, {"page_size": 1})
+        self.assertRequestIndexed(first.data["next"])
+
+    def test_trending(self):
+        """test the trending refresh and endpoint use indexes"""
+        since = timezone.now() - timedelta(days=3)
+        self.assertQuerysetIndexed(News.objects.filter(created_at__gte=since))
+        trending.refresh_trending()
+        self.assertRequestIndexed(f"{NEWS_URLS}trending/")
+
+    def test_per_author(self):
+        """test the latest news and comments of an author use indexes"""
+        news = News.objects.filter(author=self.user).order_by(
+            "-created_at", "-id"
+        )[:20]
+        comments = Comment.objects.filter(author=self.user).order_by(
+            "-created_at"
+        )[:20]
+
+        self.assertQuerysetIndexed(news)
+        self.assertQuerysetIndexed(comments)
+
+    def test_top_voted(self):
+        """test news ordered by the votes of the voting day is an index
+        scan"""
+        news = News.objects.filter(
+            votes_epoch=votes.current_epoch()
+        ).order_by("-up_votes", "-id")[:20]
+
+        self.assertQuerysetIndexed(news)
+
+    def test_duplicate_link_probe(self):
+        """test looking a link up by its hash is an index scan"""
+        hashes = [links.link_hash("https://sample.com")]
+
+        self.assertQuerysetIndexed(News.objects.filter(link_hash=hashes[0]))
+        self.assertQuerysetIndexed(News.objects.filter(link_hash__in=hashes))
+
+    def test_search(self):
+        """test a search finds its matches through the GIN indexes, only
+        the matches are sorted by rank"""
+        matches = search.search_news(
+            News.objects.all(), "sample", comments=True
+        )[:20]
+
+        plan = self.explain(*matches.query.sql_with_params())
+
+        self.assertNotIn("Seq Scan", plan)
+        self.assertIn("news_search_idx", plan)
+        self.assertIn("comment_search_idx", plan)
+
+    def test_export(self):
+        """test exports read the news and comments in creation order from
+        an index, with and without a watermark"""
+        since = timezone.now() - timedelta(days=1)
+        for kind in ("news", "comments"):
+            for watermark in (None, since):
+                with self.subTest(kind=kind, since=watermark):
+                    export = Export(kind, since=watermark)
+                    self.assertQuerysetIndexed(export.queryset())
+
+    def test_change_feed(self):
+        """test the change feed reads its changes by id and finds the id
+        of a time from an index"""
+        since = timezone.now() - timedelta(days=1)
+
+        self.assertQuerysetIndexed(
+            Change.objects.filter(id__gt=0).order_by("id")[:100]
+        )
+        self.assertQuerysetIndexed(
+            Change.objects.filter(created_at__gt=since)
+            .order_by("created_at", "id").values_list("id")[:1]
+        )
+
+    def test_threads(self):
+        """test threads, subtrees and their pages are range scans in thread
+        order, and the top replies are fetched by index"""
+        news = self.news[0]
+        first = Comment.objects.filter(news=news).order_by("path").first()
+        reply = Comment.objects.create(
+            author=self.user, news=news, parent=first, content="Re"
+        )
+        url = f"{detail_url(news.id)}comment/"
+
+        page = self.assertRequestIndexed(f"{url}thread/", {"page_size": 1})
+        self.assertRequestIndexed(page.data["next"])
+        self.assertRequestIndexed(f"{url}thread/", {"depth": 0})
+        self.assertRequestIndexed(f"{url}{first.id}/replies/")
+        self.assertQuerysetIndexed(Comment.objects.filter(parent=reply))
+
+        top = threads.top_replies(
+            Comment.objects.filter(news=news), news.id, top=2, depth=1
+        )
+        plan = self.explain(*top.query.sql_with_params())
+        self.assertNotIn("Seq Scan", plan)
+        self.assertIn("comment_top_level_idx", plan)
+        self.assertIn("comment_parent_idx", plan)
+
+    def test_list_filters(self):
+        """test every allowed filter and ordering of the list is a scan of
+        an index in the order of the page, bounded by the filters"""
+        other = get_user_model().objects.create_user(
+            email="other@mail.com", password="testpass"
+        )
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        requests = [
+            {"author": other.id},
+            {"author": other.id, "ordering": "created_at"},
+            {"author": other.id, "created_after": since},
+            {"created_after": since, "created_before": since},
+            {"ordering": "-up_votes", "min_up_votes": 1},
+            {"ordering": "up_votes", "min_up_votes": 2},
+            {"author": other.id, "ordering": "-up_votes", "min_up_votes": 1},
+        ]
+
+        for params in requests:
+            with self.subTest(params):
+                res = self.assertRequestIndexed(
+                    NEWS_URLS, params, conditions=True
+                )
+                self.assertEqual(res.status_code, 200)
@@ -0,0 +1,166 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import votes
+from core.links import link_hash, normalize_link
+from core.models import News
+from core.tests.test_bulk import BULK_URL
+from core.tests.test_news_api import (
+    NEWS_URLS,
+    clear_vote_state,
+    detail_url,
+    sample_news,
+)
+
+
+class NormalizeLinkTests(TestCase):
+    """test links naming the same story normalize alike"""
+
+    def test_normalize_link(self):
+        """test host case, default port, tracking and query order"""
+        self.assertEqual(
+            normalize_link(
+                "HTTPS://News.Example.COM:443/Story?b=2&utm_source=x"
+                "&a=1&fbclid=y#comments"
+            ),
+            "https://news.example.com/Story?a=1&b=2",
+        )
+        self.assertEqual(normalize_link("http://example.com"),
+                         "http://example.com/")
+        self.assertEqual(normalize_link("http://example.com:8080/a"),
+                         "http://example.com:8080/a")
+
+    def test_different_stories_differ(self):
+        """test the path and the real query tell stories apart"""
+        self.assertNotEqual(link_hash("https://example.com/a?id=1"),
+                            link_hash("https://example.com/a?id=2"))
+        self.assertNotEqual(link_hash("https://example.com/A"),
+                            link_hash("https://example.com/a"))
+
+
+class DuplicateLinkApiTests(TestCase):
+    """test posting a link that is already stored"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        res = self.client.post(
+            NEWS_URLS, {"title": "First", "link": "https://story.io/a?x=1"}
+        )
+        self.news = News.objects.get(pk=res.data["id"])
+        self.repost = {"title": "Again",
+                       "link": "https://STORY.io/a?x=1&utm_medium=feed"}
+
+    def test_duplicate_rejected(self):
+        """test a repost is refused with the id of the stored news"""
+        res = self.client.post(NEWS_URLS, self.repost)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["id"], self.news.id)
+        self.assertEqual(News.objects.count(), 1)
+
+    def test_duplicate_returned(self):
+        """test ?on_duplicate=return answers with the stored news"""
+        res = self.client.post(f"{NEWS_URLS}?on_duplicate=return",
+                               self.repost)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["id"], self.news.id)
+        self.assertEqual(res.data["title"], "First")
+        self.assertEqual(News.objects.count(), 1)
+
+    def test_duplicate_merged(self):
+        """test ?on_duplicate=merge counts the repost as an upvote"""
+        res = self.client.post(f"{NEWS_URLS}?on_duplicate=merge",
+                               self.repost)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["up_votes"], 1)
+        self.assertEqual(votes.live_upvotes([self.news])[self.news.id], 1)
+        self.assertEqual(News.objects.count(), 1)
+
+    def test_unknown_option(self):
+        """test an unknown ?on_duplicate= is refused"""
+        res = self.client.post(f"{NEWS_URLS}?on_duplicate=keep",
+                               self.repost)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_to_stored_link(self):
+        """test a news cannot be edited to repeat another one's link"""
+        other = self.client.post(
+            NEWS_URLS, {"title": "Other", "link": "https://other.io"}
+        )
+
+        res = self.client.patch(detail_url(other.data["id"]),
+                                {"link": self.repost["link"]})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("link", res.data)
+
+    def test_bulk_duplicates(self):
+        """test repeats of stored and earlier items in a bulk request"""
+        items = [
+            self.repost,
+            {"title": "New", "link": "https://new.io/?b=1&a=2"},
+            {"title": "New again", "link": "https://new.io/?a=2&b=1"},
+        ]
+
+        res = self.client.post(f"{BULK_URL}?on_duplicate=return", items,
+                               format="json")
+
+        results = res.data["results"]
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result["status"] for result in results],
+                         [200, 201, 200])
+        self.assertEqual(results[0]["id"], self.news.id)
+        self.assertEqual(results[2]["id"], results[1]["id"])
+        self.assertEqual(News.objects.count(), 2)
+
+    def test_bulk_duplicate_rejected_atomic(self):
+        """test an atomic bulk request with a repost creates nothing"""
+        items = [{"title": "New", "link": "https://new.io"}, self.repost]
+
+        res = self.client.post(f"{BULK_URL}?atomic=true", items,
+                               format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            [result["status"] for result in res.data["results"]], [424, 409]
+        )
+        self.assertEqual(News.objects.count(), 1)
+
+
+class BackfillLinkHashesTests(TestCase):
+    """test hashing the links of news posted before the hash"""
+
+    def test_backfill(self):
+        """test hashes are filled and a repeated link left empty"""
+        user = get_user_model().objects.create_user(
+            email="test@mail.com", password="testpass"
+        )
+        first = sample_news(user, link="https://Story.io/a")
+        repeat = sample_news(user, link="https://story.io/a?utm_source=x")
+        other = sample_news(user, link="https://other.io")
+        out = StringIO()
+
+        call_command("backfill_link_hashes", batch_size=2, stdout=out)
+
+        first.refresh_from_db()
+        repeat.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.link_hash, link_hash("https://story.io/a"))
+        self.assertIsNone(repeat.link_hash)
+        self.assertEqual(other.link_hash, link_hash(other.link))
+        self.assertIn("Hashed the links of 2 news", out.getvalue())
+        self.assertIn(str(repeat.id), out.getvalue())
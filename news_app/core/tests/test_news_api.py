@@ -1,10 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import News
+from core import votes
+from core.models import News, Comment, Vote
 from core.serializers import NewsSerializer
 
 NEWS_URLS = reverse("core:news-list")
@@ -15,6 +23,16 @@ def detail_url(news_id):
     return reverse("core:news-detail", args=[news_id])
 
 
+def upvote_url(news_id):
+    """return news upvote url"""
+    return reverse("core:news-upvote", args=[news_id])
+
+
+def history_url(news_id):
+    """return news upvote history url"""
+    return reverse("core:news-history", args=[news_id])
+
+
 def sample_news(user, **params):
     """create and return a sample news"""
     defaults = {
@@ -26,6 +44,32 @@ def sample_news(user, **params):
     return News.objects.create(author=user, **defaults)
 
 
+def clear_vote_state():
+    """drop the votes state and cached responses redis keeps between tests"""
+    redis = get_redis_connection()
+    keys = list(redis.scan_iter(match="news:*:voters:*"))
+    keys += [votes.COMPACT_STATE_KEY, votes.FLUSH_LOCK_KEY]
+    redis.delete(*keys)
+    votes.clear_upvotes()
+    votes.advance_epoch()
+
+
+def assert_constant_queries(testcase, url, add_rows):
+    """assert that GET url runs the same number of queries
+    before and after add_rows() grows the tables"""
+    with CaptureQueriesContext(connection) as before:
+        testcase.client.get(url)
+    add_rows()
+    with CaptureQueriesContext(connection) as after:
+        res = testcase.client.get(url)
+
+    testcase.assertEqual(res.status_code, status.HTTP_200_OK)
+    testcase.assertEqual(
+        len(before), len(after),
+        [query["sql"] for query in after.captured_queries],
+    )
+
+
 class PublicNewsApiTests(TestCase):
     """test unauthenticated news api access"""
 
@@ -49,6 +93,7 @@ class PrivateNewsApiTests(TestCase):
             password="testpass",
         )
         self.client.force_authenticate(self.user)
+        clear_vote_state()
 
     def test_retrieve_news(self):
         """test retrieving a list of news"""
@@ -61,11 +106,244 @@ class PrivateNewsApiTests(TestCase):
 
         res = self.client.get(NEWS_URLS)
 
-        news = News.objects.all().order_by("id")
+        news = News.objects.all().order_by("-created_at", "-id")
         serializer = NewsSerializer(news, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_retrieve_news_constant_queries(self):
+        """test listing news does not issue a query per news or comment"""
+        user2 = get_user_model().objects.create_user(
+            email="other@mail.com", password="otherpass", name="Other"
+        )
+        news = sample_news(user=self.user)
+        Comment.objects.create(author=user2, news=news, content="First")
+
+        def add_rows():
+            for author in (self.user, user2, self.user):
+                extra = sample_news(user=author)
+                for commenter in (self.user, user2):
+                    Comment.objects.create(
+                        author=commenter, news=extra, content="Comment"
+                    )
+
+        assert_constant_queries(self, NEWS_URLS, add_rows)
+
+    def test_retrieve_news_slim(self):
+        """test the slim list counts comments instead of embedding them"""
+        news = sample_news(user=self.user, comment_count=1)
+        Comment.objects.create(author=self.user, news=news, content="Hi")
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(NEWS_URLS, {"slim": "true"})
+
+        self.assertEqual(len(queries), 1)
+        item = res.data["results"][0]
+        self.assertEqual(item["comment_count"], 1)
+        self.assertNotIn("comment_news", item)
+        full = self.client.get(NEWS_URLS).data["results"][0]
+        self.assertEqual(full["comment_news"], [str(news.comment_news.get())])
+
+    def test_news_cursor_pagination(self):
+        """test walking the news feed page by page with cursors"""
+        created = [sample_news(user=self.user) for _ in range(5)]
+        # rows sharing a timestamp must still be paged without gaps
+        News.objects.filter(id__in=[n.id for n in created[1:4]]).update(
+            created_at=created[1].created_at
+        )
+
+        seen = []
+        url = f"{NEWS_URLS}?page_size=2"
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data["results"]), 2)
+            seen += [item["id"] for item in res.data["results"]]
+            url = res.data["next"]
+
+        expected = News.objects.order_by("-created_at", "-id")
+        self.assertEqual(seen, [n.id for n in expected])
+
+    def test_news_cursor_pagination_previous(self):
+        """test the previous cursor returns the page before"""
+        for _ in range(5):
+            sample_news(user=self.user)
+
+        first = self.client.get(f"{NEWS_URLS}?page_size=2")
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        self.assertIsNone(first.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+        self.assertIsNotNone(back.data["next"])
+
+    def test_news_invalid_cursor(self):
+        """test that a malformed cursor is rejected"""
+        res = self.client.get(NEWS_URLS, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upvote_is_buffered(self):
+        """test upvotes are buffered and merged into responses"""
+        news = sample_news(user=self.user)
+        user2 = get_user_model().objects.create_user(
+            email="other@mail.com", password="otherpass"
+        )
+
+        self.client.get(upvote_url(news.id))
+        self.client.force_authenticate(user2)
+        self.client.get(upvote_url(news.id))
+
+        news.refresh_from_db()
+        self.assertEqual(news.up_votes, 0)
+        res = self.client.get(detail_url(news.id))
+        self.assertEqual(res.data["up_votes"], 2)
+        res = self.client.get(NEWS_URLS)
+        self.assertEqual(res.data["results"][0]["up_votes"], 2)
+
+    def test_upvote_once_per_user(self):
+        """test a user cannot upvote the same news twice"""
+        news = sample_news(user=self.user)
+
+        res1 = self.client.get(upvote_url(news.id))
+        res2 = self.client.get(upvote_url(news.id))
+
+        self.assertEqual(res1.status_code, status.HTTP_200_OK)
+        self.assertEqual(res2.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Vote.objects.filter(news=news).count(), 1)
+        self.assertEqual(votes.pending_upvotes([news.id]), {news.id: 1})
+
+    def test_upvote_once_per_user_cold_cache(self):
+        """test the vote table rejects duplicates the redis set forgot"""
+        news = sample_news(user=self.user)
+        votes.record_upvote(news.id, self.user.id)
+        get_redis_connection().delete(
+            votes.VOTERS_KEY.format(
+                news_id=news.id, epoch=votes.current_epoch().isoformat()
+            )
+        )
+
+        self.assertFalse(votes.record_upvote(news.id, self.user.id))
+        self.assertEqual(votes.pending_upvotes([news.id]), {news.id: 1})
+
+    def test_upvote_again_next_epoch(self):
+        """test a user can vote again once the epoch has advanced"""
+        news = sample_news(user=self.user)
+        votes.advance_epoch(date(2021, 12, 1))
+        votes.record_upvote(news.id, self.user.id)
+        votes.flush_upvotes()
+
+        votes.advance_epoch(date(2021, 12, 2))
+
+        self.assertEqual(NewsSerializer(news).data["up_votes"], 0)
+        res = self.client.get(upvote_url(news.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(NewsSerializer(news).data["up_votes"], 1)
+
+    def test_upvote_history(self):
+        """test the per-day upvotes of a news"""
+        news = sample_news(user=self.user)
+        user2 = get_user_model().objects.create_user(
+            email="other@mail.com", password="otherpass"
+        )
+        votes.advance_epoch(date(2021, 12, 1))
+        votes.record_upvote(news.id, self.user.id)
+        votes.record_upvote(news.id, user2.id)
+        votes.flush_upvotes()
+        votes.advance_epoch(date(2021, 12, 2))
+        votes.record_upvote(news.id, self.user.id)
+
+        res = self.client.get(history_url(news.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {"epoch": "2021-12-02", "up_votes": 1},
+            {"epoch": "2021-12-01", "up_votes": 2},
+        ])
+
+    def test_flush_upvotes(self):
+        """test buffered upvotes are written in one batch"""
+        news1 = sample_news(
+            user=self.user, up_votes=5, votes_epoch=votes.current_epoch()
+        )
+        news2 = sample_news(user=self.user)
+        user2 = get_user_model().objects.create_user(
+            email="other@mail.com", password="otherpass"
+        )
+        votes.record_upvote(news1.id, self.user.id)
+        votes.record_upvote(news2.id, self.user.id)
+        votes.record_upvote(news2.id, user2.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            flushed = votes.flush_upvotes()
+
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(flushed, 2)
+        news1.refresh_from_db()
+        news2.refresh_from_db()
+        self.assertEqual((news1.up_votes, news2.up_votes), (6, 2))
+        self.assertEqual(votes.pending_upvotes([news1.id, news2.id]), {})
+        self.assertEqual(NewsSerializer(news1).data["up_votes"], 6)
+
+    def test_flush_makes_cached_counts_stale(self):
+        """test a response cached while a flush ran is not served after"""
+        news = sample_news(user=self.user)
+        votes.record_upvote(news.id, self.user.id)
+        etag = self.client.get(detail_url(news.id))["ETag"]
+
+        votes.flush_upvotes()
+        res = self.client.get(detail_url(news.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["up_votes"], 1)
+
+    def test_overlapping_flushes_apply_once(self):
+        """test a flush starting while another applies its batch leaves
+        it alone, the votes are counted once"""
+        news = sample_news(user=self.user)
+        votes.record_upvote(news.id, self.user.id)
+        apply = votes._apply_news_deltas
+        overlapping = []
+
+        def apply_and_overlap(deltas):
+            updated = apply(deltas)
+            overlapping.append(votes.flush_upvotes())
+            return updated
+
+        with mock.patch.object(votes, "_apply_news_deltas", apply_and_overlap):
+            flushed = votes.flush_upvotes()
+
+        self.assertEqual((flushed, overlapping), (1, [None]))
+        self.assertEqual(votes.flush_upvotes(), 0)
+        news.refresh_from_db()
+        self.assertEqual(news.up_votes, 1)
+        self.assertEqual(news.daily_votes.get().up_votes, 1)
+
+    def test_failed_flush_keeps_votes(self):
+        """test votes of a flush that fails to commit are flushed by the
+        next one"""
+        news = sample_news(user=self.user)
+        votes.record_upvote(news.id, self.user.id)
+
+        with mock.patch.object(
+            votes, "_apply_news_deltas", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                votes.flush_upvotes()
+
+        self.assertEqual(votes.pending_upvotes([news.id]), {news.id: 1})
+        self.assertEqual(votes.flush_upvotes(), 1)
+        news.refresh_from_db()
+        self.assertEqual(news.up_votes, 1)
+
+    def test_upvote_not_found(self):
+        """test upvoting a missing news returns 404"""
+        res = self.client.get(upvote_url(0))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_view_news_detail(self):
         """test viewing a news detail"""
@@ -167,3 +445,57 @@ class PrivateNewsApiTests(TestCase):
         news.refresh_from_db()
         news_exists = News.objects.filter(id=old_news).exists()
         self.assertTrue(news_exists)
+
+
+class UpvoteConcurrencyTests(TransactionTestCase):
+    """test upvotes under concurrent load"""
+
+    workers = 16
+    voters = 2000
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.news = sample_news(user=self.user)
+        clear_vote_state()
+
+    def test_parallel_upvotes_are_counted_once(self):
+        """test that parallel upvotes count exactly once per user"""
+        User = get_user_model()
+        voters = User.objects.bulk_create(
+            User(email=f"voter{i}@mail.com", password="!")
+            for i in range(self.voters)
+        )
+        url = upvote_url(self.news.id)
+
+        def upvote(users):
+            client = APIClient()
+            try:
+                codes = []
+                for user in users:
+                    client.force_authenticate(user)
+                    codes.append(client.get(url).status_code)
+                return codes
+            finally:
+                connection.close()
+
+        # every voter tries twice, from two different workers
+        attempts = voters + voters[::-1]
+        chunks = [attempts[i::self.workers] for i in range(self.workers)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            codes = [code for batch in pool.map(upvote, chunks)
+                     for code in batch]
+
+        self.assertEqual(codes.count(status.HTTP_200_OK), self.voters)
+        self.assertEqual(
+            codes.count(status.HTTP_400_BAD_REQUEST), self.voters
+        )
+        data = NewsSerializer(self.news).data
+        self.assertEqual(data["up_votes"], self.voters)
+
+        votes.flush_upvotes()
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.up_votes, self.voters)
+        self.assertEqual(Vote.objects.count(), self.voters)
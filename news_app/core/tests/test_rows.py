@@ -0,0 +1,140 @@
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Prefetch
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core import votes
+from core.models import Comment, News
+from core.renderers import ORJSONRenderer
+from core.rows import CommentRows, NewsRows
+from core.serializers import (
+    CommentSerializer,
+    NewsSerializer,
+    NewsSlimSerializer,
+)
+from core.tests.test_cache import comments_url
+from core.tests.test_news_api import NEWS_URLS, clear_vote_state, sample_news
+
+
+class RowSerializerTests(TestCase):
+    """test the row read path renders what the serializers render"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+            name="Zoë \u2028Tester",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        self.news = sample_news(user=self.user, title="Ünïcode \u2029 \"news\"")
+        self.other = sample_news(user=self.user, title="Other")
+        News.objects.filter(pk=self.other.pk).update(
+            created_at=datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        )
+        for content in ("First", "Second </script>"):
+            Comment.objects.create(
+                author=self.user, news=self.news, content=content
+            )
+        votes.record_upvote(self.news.id, self.user.id)
+
+    def assertSameBytes(self, serializer, rows, queryset):
+        expected = JSONRenderer().render(serializer.data)
+        actual = ORJSONRenderer().render(
+            rows.serialize(rows.values(queryset.all()))
+        )
+        self.assertEqual(actual, expected)
+
+    def test_news_rows(self):
+        """test news rows match NewsSerializer and its variants"""
+        queryset = News.objects.select_related("author").order_by("-id")
+        with_comments = queryset.prefetch_related(Prefetch(
+            "comment_news",
+            queryset=Comment.objects.select_related("author"),
+        ))
+        fields = ("id", "author", "comment_news", "up_votes")
+        expand = ("author", "comment_news")
+
+        self.assertSameBytes(
+            NewsSerializer(with_comments, many=True), NewsRows(),
+            with_comments,
+        )
+        self.assertSameBytes(
+            NewsSlimSerializer(queryset, many=True),
+            NewsRows(NewsSlimSerializer), queryset,
+        )
+        self.assertSameBytes(
+            NewsSerializer(with_comments, many=True, fields=fields,
+                           expand=expand),
+            NewsRows(fields=fields, expand=expand), with_comments,
+        )
+
+    def test_comment_rows(self):
+        """test comment rows match CommentSerializer"""
+        queryset = Comment.objects.select_related("author").order_by("id")
+
+        self.assertSameBytes(
+            CommentSerializer(queryset, many=True), CommentRows(), queryset
+        )
+
+    def test_list_endpoints(self):
+        """test the lists answer with what the serializers render"""
+        res = self.client.get(NEWS_URLS)
+        comments = self.client.get(comments_url(self.news.id))
+
+        self.assertIn(b"\\u2029", res.content)
+        self.assertEqual(
+            [news["id"] for news in res.json()["results"]],
+            [self.news.id, self.other.id],
+        )
+        self.assertEqual(res.json()["results"][0]["up_votes"], 1)
+        self.assertEqual(res.json()["results"][1]["created_at"],
+                         "2021-01-02T03:04:05Z")
+        self.assertEqual(
+            [comment["content"] for comment in comments.json()["results"]],
+            ["Second </script>", "First"],
+        )
+
+    def test_renderer_matches_json_renderer(self):
+        """test orjson output is byte for byte JSONRenderer output"""
+        data = {
+            "text": "line\u2028para\u2029 ünï \"q\" \\ \x01 </",
+            "when": datetime(2021, 1, 2, 3, 4, 5, 678901,
+                             tzinfo=timezone.utc),
+            "naive": datetime(2021, 1, 2, 3, 4, 5),
+            "price": Decimal("1.10"),
+            "error": ErrorDetail("Bad", code="invalid"),
+            1: [None, True, 1.5, 2 ** 70],
+            "nested": {"list": [{"a": []}]},
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_benchmark_command(self):
+        """test the benchmark reports both paths as identical"""
+        out = StringIO()
+
+        call_command("benchmark_serializers", rows=5, duration=0.05,
+                     stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[-1] for line in lines[1:]],
+                         ["yes", "yes", "yes"])
+        self.assertFalse(
+            get_user_model().objects.filter(name="Benchmark").exists()
+        )
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import search
+from core.models import Comment, News
+from core.tests.test_bulk import BULK_URL
+from core.tests.test_news_api import NEWS_URLS, clear_vote_state, sample_news
+
+
+def result_titles(res):
+    """return the titles of a page of news"""
+    return [news["title"] for news in res.data["results"]]
+
+
+class SearchApiTests(TestCase):
+    """test full-text search of news"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        self.python = sample_news(self.user, title="Python runs faster")
+        self.pythons = sample_news(
+            self.user, title="Python news: python packaging"
+        )
+        self.rust = sample_news(self.user, title="Rust compiler release")
+
+    def test_search_ranked(self):
+        """test matching news come best match first, words stemmed"""
+        res = self.client.get(NEWS_URLS, {"q": "python"})
+        running = self.client.get(NEWS_URLS, {"q": "running"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(result_titles(res),
+                         [self.pythons.title, self.python.title])
+        self.assertEqual(result_titles(running), [self.python.title])
+
+    def test_web_search_syntax(self):
+        """test quoted phrases and excluded words"""
+        phrase = self.client.get(NEWS_URLS, {"q": '"python packaging"'})
+        excluded = self.client.get(NEWS_URLS, {"q": "python -packaging"})
+
+        self.assertEqual(result_titles(phrase), [self.pythons.title])
+        self.assertEqual(result_titles(excluded), [self.python.title])
+
+    def test_search_comments(self):
+        """test ?comments=true also finds news by their comments"""
+        Comment.objects.create(
+            author=self.user, news=self.rust, content="Borrow checker woes"
+        )
+
+        titles = result_titles(self.client.get(NEWS_URLS, {"q": "borrow"}))
+        with_comments = result_titles(self.client.get(
+            NEWS_URLS, {"q": "borrow", "comments": "true"}
+        ))
+
+        self.assertEqual(titles, [])
+        self.assertEqual(with_comments, [self.rust.title])
+
+    def test_search_paginated(self):
+        """test search pages follow limit and offset"""
+        first = self.client.get(NEWS_URLS, {"q": "python", "limit": 1})
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(result_titles(first), [self.pythons.title])
+        self.assertEqual(result_titles(second), [self.python.title])
+        self.assertIsNone(second.data["next"])
+        self.assertIsNotNone(second.data["previous"])
+
+    def test_vector_follows_writes(self):
+        """test edited and bulk created news are found by their new titles"""
+        self.rust.title = "Rust gains async closures"
+        self.rust.save()
+        News.objects.filter(pk=self.python.pk).update(title="Zig 1.0")
+        self.client.post(
+            BULK_URL, [{"title": "Zig tooling", "link": "https://zig.io"}],
+            format="json",
+        )
+
+        closures = self.client.get(NEWS_URLS, {"q": "closures"})
+        zig = self.client.get(NEWS_URLS, {"q": "zig"})
+
+        self.assertEqual(result_titles(closures), [self.rust.title])
+        self.assertEqual(sorted(result_titles(zig)),
+                         ["Zig 1.0", "Zig tooling"])
+
+    def test_like_fallback(self):
+        """test the fallback for other databases matches every word"""
+        Comment.objects.create(
+            author=self.user, news=self.rust, content="Python bindings"
+        )
+        queryset = News.objects.all()
+
+        titles = search._like_search(queryset, "python faster", False)
+        with_comments = search._like_search(queryset, "python", True)
+
+        self.assertEqual([news.title for news in titles], [self.python.title])
+        self.assertEqual(
+            [news.title for news in with_comments],
+            [self.rust.title, self.pythons.title, self.python.title],
+        )
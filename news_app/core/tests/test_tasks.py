@@ -0,0 +1,122 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from core import votes
+from core.models import DailyVotes, News, Vote
+from core.serializers import NewsSerializer
+from core.tasks import compact_votes, reset_upvote
+from core.tests.test_news_api import clear_vote_state, sample_news
+
+
+class VoteEpochTests(TestCase):
+    """test the daily upvote reset and compaction of past days"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        clear_vote_state()
+        votes.advance_epoch(date(2021, 12, 1))
+
+    def test_reset_advances_epoch(self):
+        """test the reset only moves to the next day"""
+        news = sample_news(user=self.user)
+        votes.record_upvote(news.id, self.user.id)
+        votes.flush_upvotes()
+
+        result = reset_upvote.apply().get()
+
+        self.assertEqual(result, votes.today().isoformat())
+        self.assertEqual(votes.current_epoch(), votes.today())
+        self.assertEqual(NewsSerializer(news).data["up_votes"], 0)
+        news.refresh_from_db()
+        self.assertEqual(news.up_votes, 1)
+
+    def test_flush_keeps_daily_history(self):
+        """test flushed votes are added to the totals of their day"""
+        news = sample_news(user=self.user)
+        votes.record_upvote(news.id, self.user.id)
+        votes.advance_epoch(date(2021, 12, 2))
+        votes.record_upvote(news.id, self.user.id)
+
+        votes.flush_upvotes()
+
+        history = DailyVotes.objects.filter(news=news).order_by("epoch")
+        self.assertEqual(
+            list(history.values_list("epoch", "up_votes")),
+            [(date(2021, 12, 1), 1), (date(2021, 12, 2), 1)],
+        )
+        news.refresh_from_db()
+        self.assertEqual(
+            (news.up_votes, news.votes_epoch), (1, date(2021, 12, 2))
+        )
+
+    def test_compact_in_batches(self):
+        """test past days are cleaned up in batches"""
+        voted = [
+            sample_news(user=self.user, up_votes=i,
+                        votes_epoch=date(2021, 11, 30))
+            for i in range(1, 6)
+        ]
+        current = sample_news(
+            user=self.user, up_votes=7, votes_epoch=date(2021, 12, 1)
+        )
+        batches = []
+
+        state = votes.compact_votes(
+            batch_size=2, progress=lambda s: batches.append(s["last_id"])
+        )
+
+        self.assertEqual(state["rows"], 5)
+        self.assertEqual(batches, [voted[1].id, voted[3].id, voted[4].id])
+        self.assertEqual(list(News.objects.exclude(up_votes=0)), [current])
+        self.assertFalse(
+            get_redis_connection().exists(votes.COMPACT_STATE_KEY)
+        )
+
+    def test_compact_expires_votes_and_history(self):
+        """test votes of past days and old history are deleted"""
+        news = sample_news(user=self.user)
+        Vote.objects.create(news=news, user=self.user,
+                            epoch=date(2021, 11, 30))
+        today = Vote.objects.create(news=news, user=self.user,
+                                    epoch=date(2021, 12, 1))
+        DailyVotes.objects.create(news=news, epoch=date(2021, 9, 1))
+        recent = DailyVotes.objects.create(news=news,
+                                           epoch=date(2021, 11, 30))
+
+        votes.compact_votes(history_days=30)
+
+        self.assertEqual(list(Vote.objects.all()), [today])
+        self.assertEqual(list(DailyVotes.objects.all()), [recent])
+
+    def test_compact_resumes(self):
+        """test an interrupted compaction continues after the saved position"""
+        stale = date(2021, 11, 30)
+        first = sample_news(user=self.user, up_votes=4, votes_epoch=stale)
+        second = sample_news(user=self.user, up_votes=2, votes_epoch=stale)
+        get_redis_connection().hset(votes.COMPACT_STATE_KEY, mapping={
+            "epoch": date(2021, 12, 1).toordinal(), "step": 0,
+            "last_id": first.id, "rows": 1, "batches": 1, "started": 0,
+        })
+
+        state = votes.compact_votes()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.up_votes, second.up_votes), (4, 0))
+        self.assertEqual((state["rows"], state["batches"]), (2, 2))
+
+    def test_compact_task_reports_metrics(self):
+        """test the task returns rows, batches and duration"""
+        sample_news(user=self.user, up_votes=1)
+
+        result = compact_votes.apply().get()
+
+        self.assertEqual(result["rows"], 1)
+        self.assertEqual(result["batches"], 1)
+        self.assertIn("duration", result)
@@ -0,0 +1,181 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import threads
+from core.models import Comment, PATH_WIDTH
+from core.tests.test_comment_api import detail_url, sample_comment, sample_news
+from core.tests.test_news_api import clear_vote_state
+
+
+def thread_url(news_id):
+    return f"{detail_url(news_id)}comment/thread/"
+
+
+def replies_url(news_id, comment_id):
+    return f"{detail_url(news_id)}comment/{comment_id}/replies/"
+
+
+class CommentThreadApiTests(TestCase):
+    """test threaded replies to comments"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        self.news = sample_news(user=self.user)
+        # first ─┬ first.1 ── first.1.1
+        #        └ first.2
+        # second ── second.1
+        self.first = self.reply(None, "first")
+        self.second = self.reply(None, "second")
+        self.first_1 = self.reply(self.first, "first.1")
+        self.second_1 = self.reply(self.second, "second.1")
+        self.first_2 = self.reply(self.first, "first.2")
+        self.first_1_1 = self.reply(self.first_1, "first.1.1")
+
+    def reply(self, parent, content):
+        comment = sample_comment(
+            user=self.user, news=self.news, parent=parent, content=content
+        )
+        # the path is set by the database
+        comment.refresh_from_db(fields=["path"])
+        return comment
+
+    def contents(self, res):
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.data)
+        results = res.data["results"] if "results" in res.data else res.data
+        return [comment["content"] for comment in results]
+
+    def test_post_reply(self):
+        """test a reply is created under its parent"""
+        url = f"{detail_url(self.news.id)}comment/"
+
+        res = self.client.post(url, {
+            "news": self.news.id, "parent": self.first_2.id, "content": "Hi",
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["parent"], self.first_2.id)
+        reply = Comment.objects.get(pk=res.data["id"])
+        self.assertTrue(reply.path.startswith(self.first_2.path))
+        self.assertEqual(threads.depth_of(reply), 2)
+
+    def test_reply_to_other_news_refused(self):
+        """test a reply must be to a comment of the same news"""
+        other = sample_news(user=self.user, link="https://other.com")
+        url = f"{detail_url(other.id)}comment/"
+
+        res = self.client.post(url, {
+            "news": other.id, "parent": self.first.id, "content": "Hi",
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("parent", res.data)
+
+    def test_parent_cannot_change(self):
+        """test updating a comment keeps its parent"""
+        url = f"{detail_url(self.news.id)}comment/{self.first_1.id}/"
+
+        self.client.patch(url, {"parent": self.second.id, "content": "Moved"})
+
+        self.first_1.refresh_from_db()
+        self.assertEqual(self.first_1.content, "Moved")
+        self.assertEqual(self.first_1.parent, self.first)
+
+    def test_bulk_created_replies_get_paths(self):
+        """test the trigger sets paths of rows inserted in bulk"""
+        replies = Comment.objects.bulk_create(
+            Comment(author=self.user, news=self.news, parent=self.second_1,
+                    content=f"Reply {number}")
+            for number in range(2)
+        )
+
+        paths = Comment.objects.filter(
+            pk__in=[reply.pk for reply in replies]
+        ).values_list("path", flat=True)
+        for path in paths:
+            self.assertTrue(path.startswith(self.second_1.path))
+            self.assertEqual(len(path), 3 * PATH_WIDTH)
+
+    def test_thread(self):
+        """test a thread lists every comment followed by its replies"""
+        res = self.client.get(thread_url(self.news.id))
+
+        self.assertEqual(self.contents(res), [
+            "first", "first.1", "first.1.1", "first.2", "second", "second.1",
+        ])
+
+    def test_thread_pages(self):
+        """test a thread is paged in thread order"""
+        first = self.client.get(thread_url(self.news.id), {"page_size": 4})
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(self.contents(first),
+                         ["first", "first.1", "first.1.1", "first.2"])
+        self.assertEqual(self.contents(second), ["second", "second.1"])
+        self.assertIsNone(second.data["next"])
+
+    def test_thread_depth(self):
+        """test depth limits the levels of a thread"""
+        top_level = self.client.get(thread_url(self.news.id), {"depth": 0})
+        two_levels = self.client.get(thread_url(self.news.id), {"depth": 1})
+
+        self.assertEqual(self.contents(top_level), ["first", "second"])
+        self.assertEqual(self.contents(two_levels), [
+            "first", "first.1", "first.2", "second", "second.1",
+        ])
+
+    def test_replies(self):
+        """test the replies to a comment are its subtree"""
+        url = replies_url(self.news.id, self.first.id)
+
+        every = self.client.get(url)
+        direct = self.client.get(url, {"depth": 0})
+
+        self.assertEqual(self.contents(every),
+                         ["first.1", "first.1.1", "first.2"])
+        self.assertEqual(self.contents(direct), ["first.1", "first.2"])
+
+    def test_top_replies(self):
+        """test top keeps the oldest replies to each comment"""
+        thread = self.client.get(
+            thread_url(self.news.id), {"top": 1, "depth": 2}
+        )
+        replies = self.client.get(
+            replies_url(self.news.id, self.first.id), {"top": 1, "depth": 1}
+        )
+
+        self.assertEqual(self.contents(thread),
+                         ["first", "first.1", "first.1.1"])
+        self.assertEqual(self.contents(replies), ["first.1", "first.1.1"])
+
+    @override_settings(COMMENT_TREE_MAX_ROWS=10)
+    def test_top_replies_bounded(self):
+        """test a top fetch needs a depth and is capped in size"""
+        for params in ({"top": 2}, {"top": 3, "depth": 1}):
+            with self.subTest(params):
+                res = self.client.get(thread_url(self.news.id), params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_takes_replies(self):
+        """test deleting a comment deletes its replies and counts them"""
+        self.news.comment_count = 6
+        self.news.save()
+        url = f"{detail_url(self.news.id)}comment/{self.first.id}/"
+
+        self.client.delete(url)
+
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.comment_count, 2)
+        self.assertEqual(
+            list(Comment.objects.values_list("content", flat=True)
+                 .order_by("path")),
+            ["second", "second.1"],
+        )
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import trending, votes
+from core.models import News
+from core.tests.test_news_api import clear_vote_state, sample_news
+
+TRENDING_URL = reverse("core:news-trending")
+
+
+class TrendingTests(TestCase):
+    """test the trending news ranking"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@mail.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+        clear_vote_state()
+        get_redis_connection().delete(trending.TRENDING_KEY)
+
+    def backdate(self, news, hours):
+        News.objects.filter(pk=news.pk).update(
+            created_at=timezone.now() - timedelta(hours=hours)
+        )
+
+    def test_score_decays_with_age(self):
+        """test older news score lower with the same points"""
+        now = timezone.now()
+
+        fresh = trending.score(10, 0, now, now)
+        old = trending.score(10, 0, now - timedelta(hours=5), now)
+
+        self.assertGreater(fresh, old)
+        self.assertGreater(trending.score(0, 1, now, now), 0)
+
+    def test_refresh_ranks_by_votes_comments_and_age(self):
+        """test the refreshed ranking order"""
+        epoch = votes.current_epoch()
+        quiet = sample_news(user=self.user, title="quiet")
+        voted = sample_news(user=self.user, title="voted",
+                            up_votes=5, votes_epoch=epoch)
+        commented = sample_news(user=self.user, title="commented",
+                                comment_count=4)
+        aged = sample_news(user=self.user, title="aged",
+                           up_votes=20, votes_epoch=epoch)
+        self.backdate(aged, 48)
+        expired = sample_news(user=self.user, title="expired",
+                              up_votes=50, votes_epoch=epoch)
+        self.backdate(expired, 24 * 30)
+
+        scored = trending.refresh_trending(batch_size=2)
+
+        self.assertEqual(scored, 4)
+        self.assertEqual(
+            trending.top_ids(10), [commented.id, voted.id, aged.id, quiet.id]
+        )
+
+    def test_overlapping_refreshes(self):
+        """test a refresh neither adds to nor drops the build of another
+        run, and the ranking it swaps in does not expire"""
+        news = sample_news(user=self.user)
+        redis = get_redis_connection()
+        other = f"{trending.TRENDING_BUILD_KEY}:other"
+        redis.zadd(other, {"999": 1})
+
+        trending.refresh_trending()
+
+        self.assertEqual(trending.top_ids(10), [news.id])
+        self.assertEqual(redis.ttl(trending.TRENDING_KEY), -1)
+        self.assertTrue(redis.exists(other))
+        redis.delete(other)
+
+    def test_trending_endpoint(self):
+        """test the endpoint serves the top news in ranking order"""
+        low = sample_news(user=self.user, title="low")
+        high = sample_news(user=self.user, title="high")
+        votes.record_upvote(high.id, self.user.id)
+        trending.refresh_trending()
+
+        res = self.client.get(TRENDING_URL, {"limit": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(res.data[0]["id"], high.id)
+        self.assertEqual(res.data[0]["up_votes"], 1)
+        self.assertEqual(res.data[1]["id"], low.id)
+
+    def test_trending_skips_deleted_news(self):
+        """test news deleted since the refresh are left out"""
+        news = sample_news(user=self.user)
+        trending.refresh_trending()
+        news.delete()
+
+        res = self.client.get(TRENDING_URL)
+
+        self.assertEqual(res.data, [])
@@ -0,0 +1,100 @@
+"""Threaded comments.
+
+Comment.path holds the ids of the ancestors of a comment and its own, as
+PATH_WIDTH hex digits each, set on insert by the trigger of migration
+0012. In the C collation paths sort a thread depth first, every comment
+followed by its replies, oldest first. The replies under a comment, at
+any depth, are the range of paths that start with its own, and the depth
+of a comment is the length of its path. A thread, a subtree and pages of
+either are then one range scan of comment_thread_idx.
+
+The parent of a comment cannot change once it is created, its path and
+those of its replies would not follow.
+"""
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from core.models import MAX_DEPTH, PATH_WIDTH
+
+# sorts after every hex digit
+SUBTREE_END = "~"
+
+# walks down from the first level, an index scan of the first top rows
+# of each level under each comment fetched, never the whole thread
+TOP_REPLIES_SQL = """
+WITH RECURSIVE "tree" ("id", "level") AS (
+    (SELECT "id", 0 FROM "core_comment"
+     WHERE "news_id" = %s AND {first}
+     ORDER BY "path" LIMIT %s)
+    UNION ALL
+    SELECT "reply"."id", "tree"."level" + 1 FROM "tree"
+    CROSS JOIN LATERAL (
+        SELECT "id" FROM "core_comment" WHERE "parent_id" = "tree"."id"
+        ORDER BY "path" LIMIT %s
+    ) AS "reply"
+    WHERE "tree"."level" < %s
+)
+SELECT "id" FROM "tree"
+"""
+
+
+class ThreadParams(serializers.Serializer):
+    """Query parameters of a thread or of the replies to a comment"""
+
+    depth = serializers.IntegerField(
+        required=False, min_value=0, max_value=MAX_DEPTH - 1
+    )
+    top = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if "top" not in attrs:
+            return attrs
+        if "depth" not in attrs:
+            raise ValidationError({"depth": [
+                "Fetching the top replies needs a depth."
+            ]})
+        most = sum(
+            attrs["top"] ** (level + 1) for level in range(attrs["depth"] + 1)
+        )
+        if most > settings.COMMENT_TREE_MAX_ROWS:
+            raise ValidationError({"top": [
+                f"At most {settings.COMMENT_TREE_MAX_ROWS} comments are "
+                f"fetched at once, lower top or depth."
+            ]})
+        return attrs
+
+
+def depth_of(comment):
+    """0 for a top level comment, 1 for a reply to one and so on"""
+    return len(comment.path) // PATH_WIDTH - 1
+
+
+def subtree(queryset, comment=None, depth=None):
+    """return the comments of queryset under comment, or all of them,
+    down to depth levels below the first, in thread order"""
+    start = ""
+    if comment is not None:
+        start = comment.path
+        queryset = queryset.filter(
+            path__gt=start, path__lt=start + SUBTREE_END
+        )
+    if depth is not None:
+        queryset = queryset.annotate(path_length=Length("path")).filter(
+            path_length__lte=len(start) + (depth + 1) * PATH_WIDTH
+        )
+    return queryset.order_by("path")
+
+
+def top_replies(queryset, news_id, top, depth, comment=None):
+    """return the comments of queryset under comment, or the top level
+    ones of the news, with at most top replies to each, the oldest, down
+    to depth levels below the first, in thread order"""
+    if comment is None:
+        first, params = '"parent_id" IS NULL', [news_id, top]
+    else:
+        first, params = '"parent_id" = %s', [news_id, comment.pk, top]
+    ids = RawSQL(TOP_REPLIES_SQL.format(first=first), [*params, top, depth])
+    return queryset.filter(pk__in=ids).order_by("path")
@@ -0,0 +1,87 @@
+"""Precomputed "hot" ranking of recent news.
+
+``refresh_trending`` scores every news of the last few days and stores the
+scores in a Redis sorted set, so the trending endpoint reads the top K in
+O(log N + K) instead of sorting the table on each request.
+
+The score is the Hacker News style time decay::
+
+    (up_votes + comment_weight * comments) / (age_hours + 2) ** gravity
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from core import cache, votes
+from core.models import News
+
+TRENDING_KEY = "news:trending"
+# each refresh builds into its own key, suffixed with a run id, so runs
+# that overlap never add to or rename each other's ranking
+TRENDING_BUILD_KEY = "news:trending:build"
+# a build left behind by a refresh that died expires on its own
+TRENDING_BUILD_TIMEOUT = 3600
+
+
+def score(up_votes, comments, created_at, now):
+    """return the time decayed score of a news"""
+    age_hours = max((now - created_at).total_seconds(), 0) / 3600
+    points = up_votes + settings.TRENDING_COMMENT_WEIGHT * comments
+    return points / (age_hours + 2) ** settings.TRENDING_GRAVITY
+
+
+def refresh_trending(batch_size=1000):
+    """recompute the scores of recent news, return how many were scored"""
+    now = timezone.now()
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    candidates = (
+        News.objects.filter(created_at__gte=since)
+        .only("id", "created_at", "up_votes", "votes_epoch", "comment_count")
+        .order_by()
+    )
+
+    redis = get_redis_connection()
+    build_key = f"{TRENDING_BUILD_KEY}:{uuid.uuid4().hex}"
+    scored = 0
+    batch = []
+    for news in candidates.iterator(chunk_size=batch_size):
+        batch.append(news)
+        if len(batch) >= batch_size:
+            scored += _add_scores(redis, build_key, batch, now)
+            batch = []
+    if batch:
+        scored += _add_scores(redis, build_key, batch, now)
+
+    # swap the finished ranking in atomically, the last run to finish wins
+    if scored:
+        pipe = redis.pipeline()
+        pipe.rename(build_key, TRENDING_KEY)
+        pipe.persist(TRENDING_KEY)
+        pipe.execute()
+    else:
+        redis.delete(TRENDING_KEY)
+    cache.invalidate(cache.TRENDING_SCOPE)
+    return scored
+
+
+def top_ids(limit):
+    """return the ids of the limit best scored news, best first"""
+    members = get_redis_connection().zrevrange(TRENDING_KEY, 0, limit - 1)
+    return [int(member) for member in members]
+
+
+def _add_scores(redis, build_key, batch, now):
+    upvotes = votes.live_upvotes(batch)
+    pipe = redis.pipeline()
+    pipe.zadd(build_key, {
+        news.pk: score(
+            upvotes[news.pk], news.comment_count, news.created_at, now
+        )
+        for news in batch
+    })
+    pipe.expire(build_key, TRENDING_BUILD_TIMEOUT)
+    pipe.execute()
+    return len(batch)
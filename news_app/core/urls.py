@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from . import views
@@ -9,4 +9,11 @@ router.register("^news/(?P<news_id>.+)/comment", views.CommentViewSet)
 
 app_name = "core"
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    re_path(
+        r"^export/(?P<kind>news|comments)/$", views.ExportView.as_view(),
+        name="export",
+    ),
+    path("changes/", views.ChangeFeedView.as_view(), name="changes"),
+    path("", include(router.urls)),
+]
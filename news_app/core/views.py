@@ -1,41 +1,580 @@
-from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
 
-from core import serializers
-from core.models import News, Comment
+from core import (
+    cache, changes, events, search, serializers, threads, trending, votes,
+)
+from core.async_views import AsyncReadMixin
+from core.export import Export, ExportParams
+from core.filters import NewsFilter
+from core.models import Change, News, Comment
+from core.pagination import SearchPagination, ThreadPagination
+from core.rows import CommentRows, NewsRows
+from core.parsers import NDJSONParser
 
 from core.permissions import IsOwnerOrReadOnly
 from rest_framework.response import Response
+from user.authentication import CachedTokenAuthentication
 
 
-class NewsViewSet(viewsets.ModelViewSet):
+ON_DUPLICATE = ("reject", "return", "merge")
+READ_ACTIONS = ("list", "retrieve", "trending")
+# columns each serialized field reads
+FIELD_COLUMNS = {
+    "title": ("title",),
+    "link": ("link",),
+    "comment_count": ("comment_count",),
+    "author": ("author", "author__name"),
+}
+# the keyset of every ordering and what live upvotes are computed from
+LOADED_COLUMNS = ("id", "created_at", "up_votes", "votes_epoch")
+
+
+class NewsViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     serializer_class = serializers.NewsSerializer
     queryset = News.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsOwnerOrReadOnly)
+    filter_backends = (NewsFilter,)
+
+    def get_queryset(self):
+        """join authors and prefetch comments with their authors, reads
+        load only the columns and relations of the fields asked for"""
+        if self.action in ("upvote", "history"):
+            return News.objects.all()
+        queryset = News.objects.order_by("-created_at", "-id")
+        fields = self.serialized_fields()
+        if self.action in READ_ACTIONS:
+            queryset = queryset.only(*{
+                column for name in fields
+                for column in FIELD_COLUMNS.get(name, ())
+            }.union(LOADED_COLUMNS))
+        if "author" in fields:
+            queryset = queryset.select_related("author")
+        terms = self.search_terms()
+        if terms:
+            comments = _is_true(self.request.query_params.get("comments"))
+            queryset = search.search_news(queryset, terms, comments=comments)
+        if "comment_news" not in fields:
+            return queryset
+        comments = Comment.objects.select_related("author")
+        return queryset.prefetch_related(
+            Prefetch("comment_news", queryset=comments)
+        )
+
+    def serialized_fields(self):
+        """the fields of ?fields=, every field of the serializer without"""
+        allowed = self.get_serializer_class().Meta.fields
+        value = self.request.query_params.get("fields")
+        if self.action not in READ_ACTIONS or not value:
+            return allowed
+        fields = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in allowed]
+        if unknown:
+            raise ValidationError(
+                {"fields": [f"Unknown fields: {', '.join(unknown)}."]}
+            )
+        return fields
+
+    def expanded_fields(self):
+        """the relations of ?expand= to serialize as objects"""
+        value = self.request.query_params.get("expand")
+        if self.action not in READ_ACTIONS or not value:
+            return []
+        expand = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [
+            name for name in expand
+            if name not in serializers.NewsSerializer.expandable
+        ]
+        if unknown:
+            raise ValidationError(
+                {"expand": [f"Unknown relations: {', '.join(unknown)}."]}
+            )
+        return expand
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in READ_ACTIONS:
+            kwargs.setdefault("fields", self.serialized_fields())
+            kwargs.setdefault("expand", self.expanded_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def search_terms(self):
+        """the ?q= of a list, matched in web search syntax"""
+        if self.action != "list":
+            return ""
+        return self.request.query_params.get("q", "").strip()
+
+    @property
+    def paginator(self):
+        """rank search results, the feed is paged by its keyset"""
+        if not hasattr(self, "_paginator") and self.search_terms():
+            self._paginator = SearchPagination()
+        return super().paginator
+
+    def is_slim(self):
+        """whether the list should count comments instead of embedding them"""
+        slim = self.request.query_params.get("slim")
+        return self.action in ("list", "trending") and _is_true(slim)
+
+    def get_serializer_class(self):
+        if self.is_slim():
+            return serializers.NewsSlimSerializer
+        return self.serializer_class
+
+    def get_cache_scopes(self):
+        if self.action == "retrieve":
+            return [cache.news_scope(self.kwargs["pk"])]
+        if self.action == "trending":
+            return [cache.LIST_SCOPE, cache.TRENDING_SCOPE]
+        return [cache.LIST_SCOPE]
+
+    @cache.cache_response
+    def list(self, request, *args, **kwargs):
+        rows = NewsRows(
+            self.get_serializer_class(),
+            fields=self.serialized_fields(),
+            expand=self.expanded_fields(),
+        )
+        return _list_rows(self, rows)
+
+    @cache.cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False)
+    @cache.cache_response
+    def trending(self, request, *args, **kwargs):
+        """best scored recent news, by votes, comments and age"""
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        limit = min(max(limit, 1), settings.TRENDING_MAX_LIMIT)
+
+        ids = trending.top_ids(limit)
+        news = self.get_queryset().in_bulk(ids)
+        ranked = [news[pk] for pk in ids if pk in news]
+        return Response(self.get_serializer(ranked, many=True).data)
 
     @action(detail=True)
     def upvote(self, request, *args, **kwargs):
         news = self.get_object()
-        news.up_votes += 1
-        news.save()
+        if not votes.record_upvote(news.pk, request.user.pk):
+            return Response(
+                {"detail": "You have already upvoted this news."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        _publish_upvotes([news])
         return Response()
 
+    def create(self, request, *args, **kwargs):
+        """create news, or answer a repost of a stored link the way
+        ?on_duplicate= asks"""
+        on_duplicate = self.get_on_duplicate()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        link_hash = serializer.validated_data["link_hash"]
+
+        existing = News.objects.filter(link_hash=link_hash).first()
+        if existing is None:
+            try:
+                with transaction.atomic():
+                    self.perform_create(serializer)
+            except IntegrityError:
+                # created by a concurrent request since the probe
+                existing = News.objects.filter(link_hash=link_hash).first()
+                if existing is None:
+                    raise
+            else:
+                headers = self.get_success_headers(serializer.data)
+                return Response(
+                    serializer.data,
+                    status=status.HTTP_201_CREATED,
+                    headers=headers,
+                )
+
+        if on_duplicate == "reject":
+            return Response(
+                {"detail": "News with this link already exists.",
+                 "id": existing.pk},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if on_duplicate == "merge":
+            if votes.record_upvote(existing.pk, request.user.pk):
+                _publish_upvotes([existing])
+        return Response(self.get_serializer(existing).data)
+
+    def get_on_duplicate(self):
+        """what to do with a stored link: reject, return or merge"""
+        value = self.request.query_params.get(
+            "on_duplicate", settings.NEWS_ON_DUPLICATE
+        )
+        if value not in ON_DUPLICATE:
+            raise ValidationError(
+                {"on_duplicate": [f"Choose one of {', '.join(ON_DUPLICATE)}."]}
+            )
+        return value
+
+    @action(detail=False, methods=["post"],
+            parser_classes=(JSONParser, NDJSONParser))
+    def bulk(self, request, *args, **kwargs):
+        """create a JSON array or NDJSON stream of news, committing each
+        batch on its own unless ?atomic=true asks for all or nothing"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"detail": "Expected a list of news."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.NEWS_BULK_MAX_ITEMS:
+            return Response(
+                {"detail": f"Send at most {settings.NEWS_BULK_MAX_ITEMS} "
+                           f"news at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        atomic = _is_true(request.query_params.get("atomic"))
+        on_duplicate = self.get_on_duplicate()
+
+        results = [None] * len(items)
+        valid = list(range(len(items)))
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            valid = []
+            for index, errors in enumerate(serializer.errors):
+                if errors:
+                    results[index] = {
+                        "index": index, "status": 400, "errors": errors,
+                    }
+                else:
+                    valid.append(index)
+            if atomic or not valid:
+                return _bulk_abort(results, valid, 400)
+            serializer = self.get_serializer(
+                data=[items[index] for index in valid], many=True
+            )
+            serializer.is_valid(raise_exception=True)
+
+        # one indexed probe for the links already stored, repeats of them
+        # or of an earlier item are resolved once the rest is created
+        rows = list(zip(valid, serializer.validated_data))
+        stored = dict(
+            News.objects.filter(
+                link_hash__in=[attrs["link_hash"] for _, attrs in rows]
+            ).values_list("link_hash", "pk")
+        )
+        fresh, repeats, seen = [], [], set()
+        for index, attrs in rows:
+            if attrs["link_hash"] in stored or attrs["link_hash"] in seen:
+                repeats.append((index, attrs["link_hash"]))
+            else:
+                seen.add(attrs["link_hash"])
+                fresh.append((index, {**attrs, "author": request.user}))
+        if atomic and repeats and on_duplicate == "reject":
+            for index, link_hash in repeats:
+                results[index] = _duplicate_result(index, stored.get(link_hash))
+            return _bulk_abort(results, [index for index, _ in fresh], 409)
+
+        size = len(fresh) if atomic else settings.NEWS_BULK_BATCH_SIZE
+        created = []
+        conflicts = []
+        for start in range(0, len(fresh), max(size, 1)):
+            batch = fresh[start:start + size]
+            try:
+                rows = list(zip(batch, _create_news(serializer, batch)))
+            except IntegrityError:
+                if atomic:
+                    return _bulk_conflict(results, batch)
+                # a link stored by a concurrent request since the probe,
+                # the other rows of the batch are still created
+                rows = []
+                for row in batch:
+                    try:
+                        rows += zip([row], _create_news(serializer, [row]))
+                    except IntegrityError:
+                        conflicts.append(row)
+            for (index, attrs), item in rows:
+                created.append(item)
+                results[index] = {"index": index, "status": 201, "id": item.pk}
+                stored[attrs["link_hash"]] = item.pk
+
+        if conflicts:
+            stored.update(News.objects.filter(
+                link_hash__in=[attrs["link_hash"] for _, attrs in conflicts]
+            ).values_list("link_hash", "pk"))
+        for index, attrs in conflicts:
+            if attrs["link_hash"] not in stored:
+                results[index] = {
+                    "index": index, "status": 409,
+                    "errors": {"detail": "Conflicts with stored news."},
+                }
+            else:
+                repeats.append((index, attrs["link_hash"]))
+
+        merged = set()
+        for index, link_hash in repeats:
+            news_id = stored.get(link_hash)
+            if news_id is None or on_duplicate == "reject":
+                results[index] = _duplicate_result(index, news_id)
+                continue
+            if on_duplicate == "merge" and votes.record_upvote(
+                news_id, request.user.pk
+            ):
+                merged.add(news_id)
+            results[index] = {"index": index, "status": 200, "id": news_id}
+
+        if created:
+            # bulk_create sends no post_save, do what its receivers would,
+            # the changes were recorded with the rows
+            cache.invalidate(cache.LIST_SCOPE)
+            data = serializers.NewsSlimSerializer(created, many=True).data
+            for item in data:
+                events.send_event("news", item["id"], item)
+        if merged:
+            _publish_upvotes(News.objects.filter(pk__in=merged))
+
+        failed = sum(1 for result in results if result["status"] >= 400)
+        if not failed:
+            code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        elif failed < len(results):
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_409_CONFLICT
+        return _bulk_response(results, code)
+
+    @action(detail=True)
+    def history(self, request, *args, **kwargs):
+        """upvotes of the news per day, newest first"""
+        news = self.get_object()
+        history = serializers.DailyVotesSerializer(
+            news.daily_votes.order_by("-epoch"), many=True
+        ).data
+        epoch = votes.current_epoch()
+        pending = votes.pending_upvotes([news.pk], epoch).get(news.pk, 0)
+        if pending:
+            if history and history[0]["epoch"] == epoch.isoformat():
+                history[0]["up_votes"] += pending
+            else:
+                history.insert(
+                    0, {"epoch": epoch.isoformat(), "up_votes": pending}
+                )
+        return Response(history)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+def _list_rows(view, rows, queryset=None):
+    """the list response of view, serialized from values() rows"""
+    if queryset is None:
+        queryset = view.filter_queryset(view.get_queryset())
+    queryset = rows.values(queryset)
+    page = view.paginate_queryset(queryset)
+    if page is None:
+        return Response(rows.serialize(queryset))
+    return view.get_paginated_response(rows.serialize(page))
+
+
+def _is_true(value):
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+def _publish_upvotes(news_list):
+    """send the current upvotes of the news to the event streams"""
+    for news_id, up_votes in votes.live_upvotes(list(news_list)).items():
+        events.send_event("upvotes", news_id, {
+            "id": news_id, "up_votes": up_votes,
+        })
+
+
+def _create_news(serializer, rows):
+    """create the news of (index, attrs) rows in one transaction"""
+    with transaction.atomic():
+        news = serializer.create([attrs for _, attrs in rows])
+        changes.record(news, Change.CREATED)
+    return news
+
+
+def _duplicate_result(index, news_id):
+    if news_id is None:
+        return {
+            "index": index, "status": 409,
+            "errors": {"detail": "Repeats an item that failed."},
+        }
+    return {
+        "index": index, "status": 409, "id": news_id,
+        "errors": {"detail": "News with this link already exists."},
+    }
+
+
+def _bulk_abort(results, skipped, code):
+    """fail the items not failed yet of an all or nothing request"""
+    for index in skipped:
+        results[index] = {
+            "index": index, "status": 424,
+            "errors": {"detail": "Not created, others failed."},
+        }
+    return _bulk_response(results, code)
+
+
+def _bulk_conflict(results, batch):
+    """abort an all or nothing request whose batch hit a link stored by
+    another request since the probe, before any repeat is merged"""
+    stored = dict(News.objects.filter(
+        link_hash__in=[attrs["link_hash"] for _, attrs in batch]
+    ).values_list("link_hash", "pk"))
+    for index, attrs in batch:
+        if attrs["link_hash"] in stored or not stored:
+            results[index] = {
+                "index": index, "status": 409,
+                "errors": {"detail": "Conflicts with stored news."},
+            }
+    skipped = [index for index, result in enumerate(results) if not result]
+    return _bulk_abort(results, skipped, 409)
+
+
+def _bulk_response(results, code):
+    failed = sum(1 for result in results if result["status"] >= 400)
+    return Response(
+        {"created": sum(1 for result in results if result["status"] == 201),
+         "failed": failed, "results": results},
+        status=code,
+    )
+
+
+class CommentViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     serializer_class = serializers.CommentSerializer
     queryset = Comment.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsOwnerOrReadOnly)
 
     def get_queryset(self):
         news = self.kwargs["news_id"]
-        return Comment.objects.filter(news__id=news)
+        return (
+            Comment.objects.filter(news__id=news)
+            .select_related("author")
+            .order_by("-created_at", "-id")
+        )
+
+    def get_cache_scopes(self):
+        return [cache.comments_scope(self.kwargs["news_id"])]
+
+    @property
+    def paginator(self):
+        """threads are paged in thread order"""
+        if not hasattr(self, "_paginator") and self.action in (
+            "thread", "replies"
+        ):
+            self._paginator = ThreadPagination()
+        return super().paginator
+
+    @cache.cache_response
+    def list(self, request, *args, **kwargs):
+        return _list_rows(self, CommentRows())
+
+    @cache.cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False)
+    @cache.cache_response
+    def thread(self, request, *args, **kwargs):
+        """the comments of the news, each followed by its replies"""
+        return self.tree_response()
+
+    @action(detail=True)
+    @cache.cache_response
+    def replies(self, request, *args, **kwargs):
+        """the replies to the comment and theirs, in thread order"""
+        return self.tree_response(self.get_object())
+
+    def tree_response(self, comment=None):
+        """pages of the comments under comment down to ?depth=, or the
+        ?top= oldest replies to each of them in one response"""
+        params = threads.ThreadParams(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        queryset = self.get_queryset()
+        if "top" not in params:
+            queryset = threads.subtree(queryset, comment, params.get("depth"))
+            return _list_rows(self, CommentRows(), queryset)
+
+        queryset = threads.top_replies(
+            queryset, self.kwargs["news_id"], params["top"], params["depth"],
+            comment,
+        )
+        rows = CommentRows()
+        return Response(rows.serialize(rows.values(queryset)))
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            News.objects.filter(pk=comment.news_id).update(
+                comment_count=F("comment_count") + 1
+            )
+            changes.record_updates(News, [comment.news_id])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # replies go with the comment
+            _, deleted = instance.delete()
+            count = deleted[Comment._meta.label]
+            if News.objects.filter(
+                pk=instance.news_id, comment_count__gte=count
+            ).update(comment_count=F("comment_count") - count):
+                changes.record_updates(News, [instance.news_id])
+
+
+class ExportView(APIView):
+    """Stream every news or every comment to staff, see core.export.
+
+    Under ASGI this path is served by the WSGI handler in a thread of its
+    own, see news_app.asgi, as Django iterates streaming responses on the
+    event loop where the cursor cannot be read.
+    """
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, kind):
+        params = ExportParams(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        export = Export(kind, **params.validated_data)
+        response = StreamingHttpResponse(
+            export, content_type=export.content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{kind}.{export.output}"'
+        )
+        return response
+
+
+class ChangeFeedView(APIView):
+    """News and comments created, updated or deleted after a sequence
+    number or a time, see core.changes"""
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        params = changes.ChangeFeedParams(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        if "since_time" in params:
+            since = changes.since_time(params["since_time"])
+        else:
+            since = params.get("since")
+
+        results, since, more = changes.changes_after(since, params["limit"])
+        return Response({
+            "since": results[-1]["seq"] if results else since,
+            "more": more,
+            "results": results,
+        })
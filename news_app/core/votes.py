@@ -0,0 +1,339 @@
+"""Write-behind buffer for news upvotes.
+
+Upvotes are counted in a Redis hash instead of updating ``core_news`` on
+every request. ``flush_upvotes`` periodically moves the accumulated deltas
+into the database with one bulk statement per table, and readers add the
+deltas that are still buffered so responses always show the exact count.
+
+Each user may upvote a news once per voting day. A Redis set of voter ids
+per news and day answers the duplicate check in O(1); the ``Vote`` table
+with its unique ``(epoch, news, user)`` constraint stays the source of
+truth when the set has been lost.
+
+Votes are counted against a voting day, the epoch. ``News.up_votes`` only
+counts for the epoch in ``News.votes_epoch`` and reads as 0 once the
+epoch has moved on, so the daily reset only has to advance the epoch.
+``DailyVotes`` keeps the per-day totals. Rows of past epochs are cleaned
+up in the background by ``compact_votes``.
+"""
+import time
+import uuid
+from datetime import date, timedelta
+
+import pytz
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from core import cache, changes
+from core.models import DailyVotes, News, Vote
+
+EPOCH_KEY = "news:upvotes:epoch"
+EPOCH_CACHE_SECONDS = 5
+PENDING_UPVOTES_KEY = "news:upvotes:pending"
+FLUSHING_UPVOTES_KEY = "news:upvotes:flushing"
+# held by the one flush running, released only by it
+FLUSH_LOCK_KEY = "news:upvotes:flush:lock"
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+VOTERS_KEY = "news:{news_id}:voters:{epoch}"
+VOTERS_TTL = 2 * 24 * 60 * 60
+COMPACT_STATE_KEY = "news:upvotes:compact"
+COMPACT_STATE_TTL = 60 * 60
+
+_epoch_cache = {"epoch": None, "expires": 0.0}
+
+
+def today():
+    """return the current day in the timezone votes are reset in"""
+    return timezone.localdate(
+        timezone=pytz.timezone(settings.CELERY_TIMEZONE)
+    )
+
+
+def current_epoch():
+    """return the voting day votes are currently counted in"""
+    if _epoch_cache["expires"] > time.monotonic():
+        return _epoch_cache["epoch"]
+
+    redis = get_redis_connection()
+    stored = redis.get(EPOCH_KEY)
+    if stored is None:
+        redis.set(EPOCH_KEY, today().isoformat(), nx=True)
+        stored = redis.get(EPOCH_KEY)
+    return _cache_epoch(date.fromisoformat(stored.decode()))
+
+
+def advance_epoch(epoch=None):
+    """start counting votes in epoch, today by default, return it"""
+    epoch = epoch or today()
+    get_redis_connection().set(EPOCH_KEY, epoch.isoformat())
+    cache.invalidate(cache.ALL_SCOPE)
+    return _cache_epoch(epoch)
+
+
+def _cache_epoch(epoch):
+    _epoch_cache["epoch"] = epoch
+    _epoch_cache["expires"] = time.monotonic() + EPOCH_CACHE_SECONDS
+    return epoch
+
+
+def record_upvote(news_id, user_id):
+    """buffer an upvote of user_id on news_id in the current epoch
+
+    return False without counting it if the user has already voted
+    """
+    redis = get_redis_connection()
+    epoch = current_epoch()
+    voters_key = VOTERS_KEY.format(news_id=news_id, epoch=epoch.isoformat())
+    pipe = redis.pipeline()
+    pipe.sadd(voters_key, user_id)
+    pipe.expire(voters_key, VOTERS_TTL)
+    added, _ = pipe.execute()
+    if not added:
+        return False
+
+    try:
+        with transaction.atomic():
+            Vote.objects.create(news_id=news_id, user_id=user_id, epoch=epoch)
+    except IntegrityError:
+        # the set was cold, the table already had the vote
+        return False
+    except Exception:
+        redis.srem(voters_key, user_id)
+        raise
+
+    redis.hincrby(PENDING_UPVOTES_KEY, _pending_field(news_id, epoch), 1)
+    cache.invalidate(cache.LIST_SCOPE, cache.news_scope(news_id))
+    return True
+
+
+def pending_upvotes(news_ids, epoch=None):
+    """return a {news_id: delta} mapping of upvotes of the epoch
+    that are not in the database yet"""
+    news_ids = list(news_ids)
+    if not news_ids:
+        return {}
+
+    epoch = epoch or current_epoch()
+    fields = [_pending_field(news_id, epoch) for news_id in news_ids]
+    pipe = get_redis_connection().pipeline(transaction=False)
+    pipe.hmget(PENDING_UPVOTES_KEY, fields)
+    pipe.hmget(FLUSHING_UPVOTES_KEY, fields)
+    pending, flushing = pipe.execute()
+
+    deltas = {}
+    for news_id, *values in zip(news_ids, pending, flushing):
+        delta = sum(int(value) for value in values if value)
+        if delta:
+            deltas[news_id] = delta
+    return deltas
+
+
+def live_upvotes(news_list):
+    """return a {news_id: upvotes} mapping of the exact current counts"""
+    epoch = current_epoch()
+    pending = pending_upvotes((news.pk for news in news_list), epoch)
+    return {
+        news.pk: stored_upvotes(news, epoch) + pending.get(news.pk, 0)
+        for news in news_list
+    }
+
+
+def live_upvotes_of_rows(rows):
+    """live_upvotes of values() rows with id, up_votes and votes_epoch"""
+    epoch = current_epoch()
+    pending = pending_upvotes((row["id"] for row in rows), epoch)
+    return {
+        row["id"]: (row["up_votes"] if row["votes_epoch"] == epoch else 0)
+        + pending.get(row["id"], 0)
+        for row in rows
+    }
+
+
+def stored_upvotes(news, epoch):
+    """return the flushed upvotes of news that belong to epoch"""
+    return news.up_votes if news.votes_epoch == epoch else 0
+
+
+def flush_upvotes():
+    """move buffered upvotes into the database, return the number of rows,
+    None when another flush is running"""
+    redis = get_redis_connection()
+    token = uuid.uuid4().hex
+    if not redis.set(
+        FLUSH_LOCK_KEY, token, nx=True, ex=settings.UPVOTE_FLUSH_LOCK_TIMEOUT
+    ):
+        return None
+    try:
+        return _flush_upvotes(redis)
+    finally:
+        redis.eval(RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+
+
+def _flush_upvotes(redis):
+    # A leftover flushing hash means a previous flush died before it was
+    # applied, so retry it before taking the next batch.
+    if not redis.exists(FLUSHING_UPVOTES_KEY):
+        if not redis.exists(PENDING_UPVOTES_KEY):
+            return 0
+        redis.rename(PENDING_UPVOTES_KEY, FLUSHING_UPVOTES_KEY)
+
+    deltas = []
+    for field, delta in redis.hgetall(FLUSHING_UPVOTES_KEY).items():
+        if int(delta):
+            epoch, news_id = field.decode().split(":")
+            deltas.append(
+                (int(news_id), date.fromisoformat(epoch), int(delta))
+            )
+
+    if deltas:
+        with transaction.atomic():
+            _apply_daily_deltas(deltas)
+            changes.record_updates(News, _apply_news_deltas(deltas))
+    # only once committed: a failed commit leaves the batch to the next
+    # flush. Dying between the commit and here applies it twice, which
+    # is rarer than a failed commit and loses nothing
+    redis.delete(FLUSHING_UPVOTES_KEY)
+    # a read between the commit and the delete counted the deltas twice,
+    # one before the commit and after the delete not at all
+    cache.invalidate(cache.LIST_SCOPE, *{
+        cache.news_scope(news_id) for news_id, _, _ in deltas
+    })
+    return len(deltas)
+
+
+def clear_upvotes():
+    """drop every buffered upvote"""
+    get_redis_connection().delete(PENDING_UPVOTES_KEY, FLUSHING_UPVOTES_KEY)
+
+
+def compact_votes(batch_size=1000, history_days=90, progress=None):
+    """clean up what past epochs left behind, in primary key batches
+
+    Zeroes News.up_votes counted in a past epoch, deletes Vote rows of
+    past epochs and DailyVotes older than history_days. Every batch is a
+    short statement of at most batch_size rows and the position is saved
+    in redis, so a run that died resumes where it stopped. progress(state)
+    is called after each batch, the final state is returned.
+    """
+    epoch = current_epoch()
+    redis = get_redis_connection()
+    state = {
+        key.decode(): int(value)
+        for key, value in redis.hgetall(COMPACT_STATE_KEY).items()
+    }
+    if state.get("epoch") != epoch.toordinal():
+        state = {
+            "epoch": epoch.toordinal(),
+            "step": 0,
+            "last_id": 0,
+            "rows": 0,
+            "batches": 0,
+            "started": int(time.time()),
+        }
+
+    steps = [
+        (
+            News.objects.filter(
+                Q(votes_epoch__lt=epoch) | Q(votes_epoch__isnull=True)
+            ).exclude(up_votes=0),
+            lambda rows: rows.update(up_votes=0),
+        ),
+        (
+            Vote.objects.filter(epoch__lt=epoch),
+            lambda rows: rows.delete()[0],
+        ),
+        (
+            DailyVotes.objects.filter(
+                epoch__lt=epoch - timedelta(days=history_days)
+            ),
+            lambda rows: rows.delete()[0],
+        ),
+    ]
+    for step, (queryset, apply) in enumerate(steps):
+        if step < state["step"]:
+            continue
+        if step > state["step"]:
+            state.update(step=step, last_id=0)
+
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=state["last_id"])
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            state["rows"] += apply(queryset.filter(pk__in=ids))
+            state["last_id"] = ids[-1]
+            state["batches"] += 1
+            _save_compact_state(redis, state)
+            if progress is not None:
+                progress(state)
+
+    redis.delete(COMPACT_STATE_KEY)
+    return state
+
+
+def _save_compact_state(redis, state):
+    pipe = redis.pipeline()
+    pipe.hset(COMPACT_STATE_KEY, mapping=state)
+    pipe.expire(COMPACT_STATE_KEY, COMPACT_STATE_TTL)
+    pipe.execute()
+
+
+def _pending_field(news_id, epoch):
+    return f"{epoch.isoformat()}:{news_id}"
+
+
+def _apply_daily_deltas(deltas):
+    """add the deltas to the per-day totals, skipping deleted news"""
+    table = connection.ops.quote_name(DailyVotes._meta.db_table)
+    news_table = connection.ops.quote_name(News._meta.db_table)
+    values = ", ".join(["(%s::bigint, %s::date, %s::integer)"] * len(deltas))
+    params = [value for row in deltas for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (news_id, epoch, up_votes) "
+            f"SELECT v.id, v.epoch, v.delta "
+            f"FROM (VALUES {values}) AS v(id, epoch, delta) "
+            f"JOIN {news_table} ON {news_table}.id = v.id "
+            f"ON CONFLICT (news_id, epoch) DO UPDATE "
+            f"SET up_votes = {table}.up_votes + EXCLUDED.up_votes",
+            params,
+        )
+
+
+def _apply_news_deltas(deltas):
+    """add the deltas to News.up_votes, restarting counts of past epochs,
+    return the ids of the news updated"""
+    latest = {}
+    for news_id, epoch, delta in deltas:
+        if news_id not in latest or latest[news_id][0] < epoch:
+            latest[news_id] = (epoch, delta)
+    rows = [(news_id, epoch, delta)
+            for news_id, (epoch, delta) in latest.items()]
+
+    table = connection.ops.quote_name(News._meta.db_table)
+    values = ", ".join(["(%s::bigint, %s::date, %s::integer)"] * len(rows))
+    params = [value for row in rows for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET up_votes = CASE "
+            f"WHEN {table}.votes_epoch = v.epoch "
+            f"THEN {table}.up_votes + v.delta ELSE v.delta END, "
+            f"votes_epoch = v.epoch "
+            f"FROM (VALUES {values}) AS v(id, epoch, delta) "
+            f"WHERE {table}.id = v.id AND ({table}.votes_epoch IS NULL "
+            f"OR {table}.votes_epoch <= v.epoch) RETURNING {table}.id",
+            params,
+        )
+        return sorted(row[0] for row in cursor.fetchall())
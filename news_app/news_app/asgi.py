@@ -9,8 +9,60 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
 from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from whitenoise import WhiteNoise
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "news_app.settings")
+os.environ.setdefault("ASGI", "1")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+wsgi_application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from core.events import event_stream  # noqa: E402
+
+
+def not_found(environ, start_response):
+    start_response("404 Not Found", [("Content-Type", "text/plain")])
+    return [b"Not Found"]
+
+
+static_application = WsgiToAsgi(
+    WhiteNoise(not_found, root=settings.STATIC_ROOT,
+               prefix=settings.STATIC_URL)
+)
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """run the WSGI app in a thread of the pool, not in the one thread
+    every sync Django view shares"""
+
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__["run_wsgi_app"].func,
+        thread_sensitive=False,
+    )
+
+
+async def export_application(scope, receive, send):
+    """serve exports with the WSGI handler, which reads the rows of a
+    streaming response in the thread that runs the view"""
+    await ThreadedWsgiToAsgiInstance(wsgi_application)(scope, receive, send)
+
+
+async def application(scope, receive, send):
+    """serve static files with WhiteNoise, the event stream on the loop,
+    exports in a thread and everything else with django"""
+    if scope["type"] == "http" and scope["path"] == settings.EVENTS_PATH:
+        await event_stream(scope, receive, send)
+    elif (scope["type"] == "http"
+            and scope["path"].startswith(settings.EXPORT_PATH)):
+        await export_application(scope, receive, send)
+    elif (scope["type"] == "http" and not settings.DEBUG
+            and scope["path"].startswith(settings.STATIC_URL)):
+        await static_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
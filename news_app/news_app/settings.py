@@ -52,7 +52,6 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    'whitenoise.middleware.WhiteNoiseMiddleware',
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -60,6 +59,10 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
+# WhiteNoise is sync only and would hold a thread for every ASGI request,
+# news_app.asgi serves the static files itself
+if not config("ASGI", default=False, cast=bool):
+    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
 ROOT_URLCONF = "news_app.urls"
 
@@ -99,6 +102,23 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
+# Argon2 first, the others verify older hashes until they are rehashed
+PASSWORD_HASHERS = [
+    "user.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+PASSWORD_ARGON2_TIME_COST = config(
+    "PASSWORD_ARGON2_TIME_COST", default=2, cast=int
+)
+# KiB of memory per hash
+PASSWORD_ARGON2_MEMORY_COST = config(
+    "PASSWORD_ARGON2_MEMORY_COST", default=19456, cast=int
+)
+PASSWORD_ARGON2_PARALLELISM = config(
+    "PASSWORD_ARGON2_PARALLELISM", default=1, cast=int
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -138,6 +158,15 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, "staticfiles")]
 if not DEBUG:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "PAGE_SIZE": 20,
+}
+
 AUTH_USER_MODEL = "user.User"
 BASE_URL = "127.0.0.1:8000"
 
@@ -148,19 +177,96 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REDIS_URL = config("REDIS_URL")
 
+# ssl_cert_reqs is only understood by TLS (rediss://) connections
+REDIS_POOL_KWARGS = {}
+if REDIS_URL.startswith("rediss://"):
+    REDIS_POOL_KWARGS["ssl_cert_reqs"] = None
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": REDIS_URL,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-            "CONNECTION_POOL_KWARGS": {
-                "ssl_cert_reqs": None
-            },
+            "CONNECTION_POOL_KWARGS": REDIS_POOL_KWARGS,
         }
     }
 }
 
+# Seconds between writes of buffered upvotes to the database
+UPVOTE_FLUSH_INTERVAL = config("UPVOTE_FLUSH_INTERVAL", default=10, cast=int)
+# Seconds the lock of a flush is held at most, a flush that died is
+# replaced after it
+UPVOTE_FLUSH_LOCK_TIMEOUT = 300
+# Rows cleaned up per statement when compacting past voting days
+VOTE_COMPACT_BATCH_SIZE = config(
+    "VOTE_COMPACT_BATCH_SIZE", default=1000, cast=int
+)
+# Days of per-day upvote history kept for each news
+VOTE_HISTORY_DAYS = config("VOTE_HISTORY_DAYS", default=90, cast=int)
+
+# Trending news ranking, see core.trending
+TRENDING_REFRESH_INTERVAL = config(
+    "TRENDING_REFRESH_INTERVAL", default=60, cast=int
+)
+TRENDING_WINDOW_DAYS = config("TRENDING_WINDOW_DAYS", default=3, cast=int)
+TRENDING_GRAVITY = 1.8
+TRENDING_COMMENT_WEIGHT = 2
+TRENDING_MAX_LIMIT = 100
+
+# Rendered API responses, see core.cache. A TTL of 0 turns caching off
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", default=300, cast=int)
+# Seconds a recompute may hold the lock before others compute as well
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+# Seconds a request waits for another one's recompute before doing its own
+RESPONSE_CACHE_WAIT = 2
+
+# Users of auth tokens, see user.authentication
+AUTH_TOKEN_CACHE_TTL = config("AUTH_TOKEN_CACHE_TTL", default=300, cast=int)
+# Seconds a process trusts its own copy without asking redis
+AUTH_TOKEN_LOCAL_TTL = 5
+AUTH_TOKEN_LOCAL_SIZE = 10000
+# Password checks running at once over all workers, see user.limits
+LOGIN_CONCURRENCY = config("LOGIN_CONCURRENCY", default=4, cast=int)
+# Seconds after which the slot of a crashed check is reclaimed
+LOGIN_SLOT_TIMEOUT = 10
+
+# Server-Sent Events, see core.events. Events kept for clients resuming
+# with Last-Event-ID
+EVENT_STREAM_LENGTH = config("EVENT_STREAM_LENGTH", default=10000, cast=int)
+# Events buffered per client before a slow one is disconnected
+EVENT_QUEUE_SIZE = 1000
+# Seconds between keepalive comments of an idle stream
+EVENT_KEEPALIVE = 15
+# Milliseconds a client waits before reconnecting
+EVENT_RETRY_MS = 3000
+EVENTS_PATH = "/api/events/"
+
+# Comments a ?top= fetch of a thread may return, see core.threads
+COMMENT_TREE_MAX_ROWS = 1000
+
+# Items one bulk news request may hold, see core.views.NewsViewSet.bulk
+NEWS_BULK_MAX_ITEMS = config("NEWS_BULK_MAX_ITEMS", default=1000, cast=int)
+# Rows inserted per query, and per transaction unless ?atomic= is set
+NEWS_BULK_BATCH_SIZE = config("NEWS_BULK_BATCH_SIZE", default=200, cast=int)
+# What posting a stored link does unless ?on_duplicate= says otherwise:
+# reject it, return the stored news or merge the post into its upvotes
+NEWS_ON_DUPLICATE = config("NEWS_ON_DUPLICATE", default="reject")
+
+# Rows an export fetches from its cursor at a time, see core.export
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+EXPORT_PATH = "/api/export/"
+
+# Change feed, see core.changes. Seconds a change waits for the writes
+# with lower sequence numbers to commit before it is served. A write that
+# commits later, or an app server clock running behind by more, can be
+# missed by clients already past it
+CHANGES_SETTLE_SECONDS = config("CHANGES_SETTLE_SECONDS", default=5, cast=int)
+CHANGES_PAGE_SIZE = 100
+CHANGES_MAX_PAGE_SIZE = 1000
+CHANGES_RETENTION_DAYS = config("CHANGES_RETENTION_DAYS", default=30, cast=int)
+CHANGES_PRUNE_BATCH_SIZE = 5000
+
 CELERY_BROKER_URL = REDIS_URL
 CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_RESULT_SERIALIZER = "json"
@@ -171,7 +277,23 @@ CELERY_BEAT_SCHEDULE = {
     "reset_upvote": {
         "task": "core.tasks.reset_upvote",
         "schedule": crontab(minute=0, hour=0),
-    }
+    },
+    "compact_votes": {
+        "task": "core.tasks.compact_votes",
+        "schedule": crontab(minute=15, hour=0),
+    },
+    "flush_upvotes": {
+        "task": "core.tasks.flush_upvotes",
+        "schedule": UPVOTE_FLUSH_INTERVAL,
+    },
+    "refresh_trending": {
+        "task": "core.tasks.refresh_trending",
+        "schedule": TRENDING_REFRESH_INTERVAL,
+    },
+    "prune_changes": {
+        "task": "core.tasks.prune_changes",
+        "schedule": crontab(minute=30, hour=0),
+    },
 }
 
 
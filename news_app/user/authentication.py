@@ -0,0 +1,175 @@
+"""Token authentication without a database query per request.
+
+``CachedTokenAuthentication`` keeps a snapshot of the user a token belongs
+to in Redis and in a small LRU inside each process. The Redis entry is
+dropped when the token is deleted or rotated and whenever the user is
+saved, e.g. deactivated or given a new password. Other processes may keep
+using their local copy for AUTH_TOKEN_LOCAL_TTL seconds at most.
+
+The snapshot holds no password hash. The cached user loads its other
+fields lazily and only saves the fields it has loaded.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, router, transaction
+from django_redis import get_redis_connection
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+from core.async_redis import get_async_redis
+
+TOKEN_USER_KEY = "user:token:{digest}"
+SNAPSHOT_FIELDS = ("id", "email", "name", "is_active", "is_staff",
+                   "is_superuser")
+
+
+class LocalCache:
+    """Thread safe LRU of values that expire after a number of seconds"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalCache(settings.AUTH_TOKEN_LOCAL_SIZE)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication remembering which user a token belongs to"""
+
+    def authenticate_credentials(self, key):
+        digest = token_digest(key)
+        snapshot = local_tokens.get(digest)
+        if snapshot is None:
+            cached = get_redis_connection().get(
+                TOKEN_USER_KEY.format(digest=digest)
+            )
+            if cached is not None:
+                snapshot = _load_snapshot(digest, cached)
+
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            remember_token(key, user)
+            return user, token
+
+        user = snapshot_user(snapshot)
+        return user, self.get_model()(key=key, user=user)
+
+    async def aauthenticate(self, request):
+        """return the cached (user, token) of the token of request, or None
+        when there is no token or its user is not cached"""
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            return None
+        return await self.acached_credentials(key)
+
+    async def acached_credentials(self, key):
+        """return the cached (user, token) of key, or None"""
+        digest = token_digest(key)
+        snapshot = local_tokens.get(digest)
+        if snapshot is None:
+            cached = await get_async_redis().get(
+                TOKEN_USER_KEY.format(digest=digest)
+            )
+            if cached is None:
+                return None
+            snapshot = _load_snapshot(digest, cached)
+
+        user = snapshot_user(snapshot)
+        return user, self.get_model()(key=key, user=user)
+
+
+def snapshot_user(snapshot):
+    """return a user loaded from snapshot with other fields deferred"""
+    model = get_user_model()
+    # from_db expects the loaded values in the order of the fields
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname in snapshot
+    ]
+    # loaded from the database a read of the user would go to, so deferred
+    # fields and saves use it and not the default routing
+    return model.from_db(
+        router.db_for_read(model), names, [snapshot[name] for name in names]
+    )
+
+
+def _load_snapshot(digest, cached):
+    snapshot = json.loads(cached)
+    local_tokens.set(digest, snapshot, settings.AUTH_TOKEN_LOCAL_TTL)
+    return snapshot
+
+
+def token_digest(key):
+    """return the name a token is cached under, not the token itself"""
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def remember_token(key, user):
+    """cache the snapshot of the user a token belongs to"""
+    digest = token_digest(key)
+    snapshot = {name: getattr(user, name) for name in SNAPSHOT_FIELDS}
+    get_redis_connection().set(
+        TOKEN_USER_KEY.format(digest=digest),
+        json.dumps(snapshot),
+        ex=settings.AUTH_TOKEN_CACHE_TTL,
+    )
+    local_tokens.set(digest, snapshot, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def forget_tokens(*keys):
+    """drop the cached users of the tokens, again once committed"""
+    if not keys:
+        return
+    _forget(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _forget(keys))
+
+
+def _forget(keys):
+    digests = [token_digest(key) for key in keys]
+    get_redis_connection().delete(
+        *(TOKEN_USER_KEY.format(digest=digest) for digest in digests)
+    )
+    for digest in digests:
+        local_tokens.pop(digest)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 with the cost taken from the settings
+
+    Django rehashes a password on the next successful login when its
+    stored cost differs, so changing the settings migrates users lazily.
+    """
+
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
+    memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+    parallelism = settings.PASSWORD_ARGON2_PARALLELISM
@@ -0,0 +1,43 @@
+"""Limit on concurrent password checks across all workers.
+
+Hashing a password keeps a worker busy for tens of milliseconds of CPU.
+Without a limit a burst of logins takes every worker and the news
+endpoints queue behind it. Logins beyond LOGIN_CONCURRENCY are rejected
+right away with a 429, which costs the worker next to nothing.
+
+The slots are members of a Redis sorted set scored by the time they
+were taken. Slots older than LOGIN_SLOT_TIMEOUT belong to a worker that
+died and are reclaimed.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.exceptions import Throttled
+
+LOGIN_SLOTS_KEY = "user:login:slots"
+
+
+@contextmanager
+def credential_check_slot():
+    """hold a password check slot, raise Throttled when all are taken"""
+    redis = get_redis_connection()
+    slot = uuid.uuid4().hex
+    now = time.time()
+    pipe = redis.pipeline()
+    pipe.zremrangebyscore(
+        LOGIN_SLOTS_KEY, "-inf", now - settings.LOGIN_SLOT_TIMEOUT
+    )
+    pipe.zadd(LOGIN_SLOTS_KEY, {slot: now})
+    pipe.zrank(LOGIN_SLOTS_KEY, slot)
+    pipe.expire(LOGIN_SLOTS_KEY, settings.LOGIN_SLOT_TIMEOUT)
+    rank = pipe.execute()[2]
+
+    try:
+        if rank >= settings.LOGIN_CONCURRENCY:
+            raise Throttled(wait=1)
+        yield
+    finally:
+        redis.zrem(LOGIN_SLOTS_KEY, slot)
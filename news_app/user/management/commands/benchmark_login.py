@@ -0,0 +1,162 @@
+import json
+import logging
+import secrets
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    """django command to measure login throughput and its cost to reads"""
+
+    help = (
+        "Run reads of a news endpoint alone and then next to a burst of "
+        "logins, and report login throughput and read latencies"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration", type=float, default=10,
+            help="Seconds each phase runs",
+        )
+        parser.add_argument(
+            "--login-threads", type=int, default=8,
+            help="Threads logging in back to back",
+        )
+        parser.add_argument(
+            "--read-threads", type=int, default=4,
+            help="Threads reading the news endpoint back to back",
+        )
+        parser.add_argument(
+            "--read-path", default=reverse("core:news-list"),
+            help="Endpoint read while logins run",
+        )
+        parser.add_argument(
+            "--url",
+            help="Base url of a running server, the default runs the "
+                 "requests in this process",
+        )
+
+    def handle(self, *args, **options):
+        self.base_url = options["url"]
+        email = f"benchmark-{secrets.token_hex(4)}@example.com"
+        password = secrets.token_urlsafe(16)
+        user = get_user_model().objects.create_user(
+            email=email, password=password, name="Benchmark"
+        )
+        token = Token.objects.create(user=user)
+        # throttled logins are expected, do not log each of them
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            login = ("POST", reverse("user:token"),
+                     {"email": email, "password": password}, None)
+            read = ("GET", options["read_path"], None, token.key)
+            duration = options["duration"]
+
+            baseline = self.run_phase(duration, {
+                "read": (read, options["read_threads"]),
+            })
+            loaded = self.run_phase(duration, {
+                "read": (read, options["read_threads"]),
+                "login": (login, options["login_threads"]),
+            })
+        finally:
+            request_logger.setLevel(level)
+            user.delete()
+
+        self.stdout.write(
+            f"{'phase':<10}{'logins/s':>10}{'throttled/s':>13}"
+            f"{'reads/s':>10}{'read p50':>10}{'read p99':>10}"
+        )
+        for name, results in (("baseline", baseline), ("logins", loaded)):
+            logins = results.get("login", [])
+            reads = sorted(
+                elapsed for status, elapsed in results["read"]
+                if status == 200
+            )
+            self.stdout.write(
+                f"{name:<10}"
+                f"{_rate(logins, 200, duration):>10.1f}"
+                f"{_rate(logins, 429, duration):>13.1f}"
+                f"{len(reads) / duration:>10.1f}"
+                f"{_percentile(reads, 0.5):>8.1f}ms"
+                f"{_percentile(reads, 0.99):>8.1f}ms"
+            )
+
+    def run_phase(self, duration, workloads):
+        """send each {name: (request, threads)} workload from its threads
+        for duration seconds, return the (status, elapsed) of every
+        request by workload name"""
+        results = {name: [] for name in workloads}
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(
+                target=self.repeat, args=(request, deadline, results[name])
+            )
+            for name, (request, count) in workloads.items()
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def repeat(self, request, deadline, results):
+        client = Client()
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status = self.send(client, *request)
+                results.append((status, time.perf_counter() - started))
+                if status == 429:
+                    # back off as Retry-After asks
+                    time.sleep(max(min(1, deadline - time.monotonic()), 0))
+        finally:
+            connection.close()
+
+    def send(self, client, method, path, data, token):
+        """send a request, return its status code"""
+        headers = {}
+        if token is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Token {token}"
+        if self.base_url is None:
+            if method == "POST":
+                return client.post(path, data, **headers).status_code
+            return client.get(path, **headers).status_code
+
+        request = Request(
+            self.base_url.rstrip("/") + path,
+            method=method,
+            data=json.dumps(data).encode() if data is not None else None,
+            headers={"Content-Type": "application/json"},
+        )
+        if token is not None:
+            request.add_header("Authorization", f"Token {token}")
+        try:
+            with urlopen(request) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            return error.code
+
+
+def _rate(results, status, duration):
+    return sum(1 for code, _ in results if code == status) / duration
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(len(values) * fraction))
+    return values[index] * 1000
@@ -3,6 +3,7 @@ from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from rest_framework import serializers
 
+from user.limits import credential_check_slot
 from user.models import User
 
 
@@ -58,11 +59,12 @@ class AuthTokenSerializer(serializers.Serializer):
         email = attrs.get("email")
         password = attrs.get("password")
 
-        user = authenticate(
-            request=self.context.get("request"),
-            username=email,
-            password=password
-        )
+        with credential_check_slot():
+            user = authenticate(
+                request=self.context.get("request"),
+                username=email,
+                password=password
+            )
 
         if not user:
             msg = "Unable to authenticate with provided credentials"
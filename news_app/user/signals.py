@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import forget_tokens
+
+
+@receiver((post_save, post_delete), sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """drop the cached user of a rotated or deleted token"""
+    forget_tokens(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance, created, update_fields, **kwargs):
+    """drop the cached snapshots of a changed user"""
+    if created or update_fields is not None and set(update_fields) <= {
+        "last_login"
+    }:
+        return
+    forget_tokens(
+        *Token.objects.filter(user=instance).values_list("key", flat=True)
+    )
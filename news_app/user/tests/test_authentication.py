@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import (
+    TOKEN_USER_KEY,
+    local_tokens,
+    snapshot_user,
+    token_digest,
+)
+
+ME_URL = reverse("user:me")
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """test token lookups are cached and dropped on changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@gmail.com", password="testpass", name="Test Person"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        local_tokens.clear()
+
+    def cached(self, key):
+        """return whether redis has the user of the token"""
+        redis_key = TOKEN_USER_KEY.format(digest=token_digest(key))
+        return bool(get_redis_connection().exists(redis_key))
+
+    def test_second_request_without_queries(self):
+        """test the user of a token is only queried once"""
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, {"email": "test@gmail.com", "name": "Test Person"}
+        )
+
+    def test_shared_through_redis(self):
+        """test another process finds the user in redis"""
+        self.client.get(ME_URL)
+        local_tokens.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_rejected(self):
+        """test a deactivated user can no longer authenticate"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rotated_token_rejected(self):
+        """test the old key of a rotated token is rejected"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        token = Token.objects.create(user=self.user)
+        old = self.client.get(ME_URL)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        new = self.client.get(ME_URL)
+
+        self.assertEqual(old.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(new.status_code, status.HTTP_200_OK)
+
+    def test_password_change_drops_snapshot(self):
+        """test changing the password drops the cached user"""
+        self.client.get(ME_URL)
+        self.assertTrue(self.cached(self.token.key))
+
+        self.client.patch(ME_URL, {"password": "passtest"})
+
+        self.assertFalse(self.cached(self.token.key))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("passtest"))
+
+    def test_cached_user_update_keeps_password(self):
+        """test updating a cached user leaves the uncached fields alone"""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {"name": "New Person"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, "New Person")
+        self.assertTrue(self.user.check_password("testpass"))
+
+    def test_snapshot_user_has_database(self):
+        """test a user loaded from a snapshot belongs to the database and
+        loads its deferred fields from it"""
+        user = snapshot_user({"id": self.user.id, "email": self.user.email})
+
+        self.assertEqual(user._state.db, DEFAULT_DB_ALIAS)
+        self.assertFalse(user._state.adding)
+        self.assertTrue(user.check_password("testpass"))
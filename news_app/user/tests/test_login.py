@@ -0,0 +1,92 @@
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.limits import LOGIN_SLOTS_KEY
+
+TOKEN_URL = reverse("user:token")
+
+
+class LoginTests(TestCase):
+    """test password hashing and the limit on password checks"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {"email": "test@gmail.com", "password": "testpass"}
+        self.user = get_user_model().objects.create_user(**self.payload)
+        get_redis_connection().delete(LOGIN_SLOTS_KEY)
+
+    def test_new_passwords_use_argon2(self):
+        """test passwords are hashed with argon2"""
+        self.assertTrue(self.user.password.startswith("argon2$"))
+
+    def test_old_hash_upgraded_on_login(self):
+        """test a PBKDF2 password is rehashed with argon2 on login"""
+        self.user.password = make_password(
+            "testpass", hasher="pbkdf2_sha256"
+        )
+        self.user.save()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+        self.assertTrue(self.user.check_password("testpass"))
+
+    def test_slot_released(self):
+        """test a login gives its slot back"""
+        self.client.post(TOKEN_URL, self.payload)
+        self.client.post(TOKEN_URL, {**self.payload, "password": "wrong"})
+
+        self.assertEqual(get_redis_connection().zcard(LOGIN_SLOTS_KEY), 0)
+
+    @override_settings(LOGIN_CONCURRENCY=1)
+    def test_busy_login_throttled(self):
+        """test logins beyond the limit are rejected with Retry-After"""
+        redis = get_redis_connection()
+        redis.zadd(LOGIN_SLOTS_KEY, {"other": time.time()})
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertEqual(redis.zrange(LOGIN_SLOTS_KEY, 0, -1), [b"other"])
+
+    @override_settings(LOGIN_CONCURRENCY=1, LOGIN_SLOT_TIMEOUT=10)
+    def test_stale_slot_reclaimed(self):
+        """test the slot of a crashed check is taken over"""
+        get_redis_connection().zadd(
+            LOGIN_SLOTS_KEY, {"crashed": time.time() - 60}
+        )
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class BenchmarkLoginCommandTests(TransactionTestCase):
+    """test the login benchmark command"""
+
+    def test_benchmark_reports_phases(self):
+        """test both phases are reported and the benchmark user removed"""
+        out = StringIO()
+
+        call_command(
+            "benchmark_login", duration=0.3, login_threads=1,
+            read_threads=1, stdout=out,
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertIn("read p99", lines[0])
+        self.assertEqual([line.split()[0] for line in lines[1:]],
+                         ["baseline", "logins"])
+        self.assertFalse(get_user_model().objects.exists())